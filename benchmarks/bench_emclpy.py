@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+bench_emclpy
+----------------------------------
+
+Benchmarks for `emclpy` run against tests/fake_emcli.py, so no OMS is
+needed.  Each benchmark is run once per execution mode:
+
+    memory - verb output is captured in memory
+    spill - verb output is spooled to disk past a small threshold
+
+Run with:
+
+    python benchmarks/bench_emclpy.py [--targets 100000] [--calls 20]
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import emclpy
+from emclpy import bulk
+
+FAKE_EMCLI = os.path.join(os.path.dirname(HERE), 'tests', 'fake_emcli.py')
+
+# Targets per modify_group call in the bulk benchmark.
+BULK_BATCH = 50
+
+# Execution modes, name: spill_threshold
+MODES = {'memory': None,
+         'spill': 64 * 1024}
+
+
+def make_emcli(mode):
+    """ Returns an Emclpy object wired to the fake emcli. """
+
+    emcli = emclpy.Emclpy('https://localhost:7799/em', 'sysman', 'welcome1',
+                          spill_threshold=MODES[mode])
+    emcli.emcli_bin = FAKE_EMCLI
+    return emcli
+
+
+def bench_call_overhead(mode, options):
+    """ Mean seconds per sync call. """
+
+    emcli = make_emcli(mode)
+    start = time.time()
+    for _ in range(options.calls):
+        emcli.sync()
+    return (time.time() - start) / options.calls, 's/call'
+
+
+def bench_parse_throughput(mode, options):
+    """ Targets parsed per second from get_targets. """
+
+    emcli = make_emcli(mode)
+    start = time.time()
+    code, targets, err = emcli.get_targets()
+    elapsed = time.time() - start
+    return len(targets) / elapsed, 'targets/s'
+
+
+def bench_memory_peak(mode, options):
+    """ Peak RSS of a fresh interpreter that reads every target once. """
+
+    out = subprocess.check_output([sys.executable, __file__, '--child',
+                                   mode, '--targets', str(options.targets)])
+    return int(out) / 1024.0, 'MB'
+
+
+def bench_bulk_throughput(mode, options):
+    """ Group members added per second by a BulkRunner that sends
+        options.calls modify_group batches of BULK_BATCH targets.
+    """
+
+    emcli = make_emcli(mode)
+    jobs = [bulk.Job('batch{0}'.format(job), [bulk.Step(
+        'modify_group', 'modify_group',
+        {'group_name': 'Test_Group',
+         'add_targets': [('host{0:06d}.example.com'.format(
+             job * BULK_BATCH + index), 'host')
+             for index in range(BULK_BATCH)]})])
+        for job in range(options.calls)]
+    journal = os.path.join(options.state_dir,
+                           '{0}_bulk_journal.log'.format(mode))
+    start = time.time()
+    bulk.BulkRunner(emcli, journal, workers=options.workers).run(jobs)
+    return options.calls * BULK_BATCH / (time.time() - start), 'targets/s'
+
+
+BENCHMARKS = [('call_overhead', bench_call_overhead),
+              ('parse_throughput', bench_parse_throughput),
+              ('memory_peak', bench_memory_peak),
+              ('bulk_throughput', bench_bulk_throughput)]
+
+
+def child(mode):
+    """ Streams every target through iter_targets and prints the peak
+        RSS in KB.  In memory mode the whole output is still held while
+        it is read, in spill mode only a chunk of it.
+    """
+
+    for _ in make_emcli(mode).iter_targets():
+        pass
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark emclpy against a fake emcli.')
+    parser.add_argument('--targets', type=int, default=100000,
+                        help='synthetic targets returned by get_targets')
+    parser.add_argument('--calls', type=int, default=20,
+                        help='calls made by the per call benchmarks')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='BulkRunner workers in the bulk benchmark')
+    parser.add_argument('--startup', type=float, default=0.0,
+                        help='seconds of emulated JVM startup per call')
+    parser.add_argument('--modes', default=','.join(sorted(MODES)),
+                        help='comma separated execution modes to run')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    os.environ['FAKE_EMCLI_TARGETS'] = str(options.targets)
+    os.environ['FAKE_EMCLI_STARTUP'] = str(options.startup)
+    if options.child:
+        child(options.child)
+        return 0
+
+    options.state_dir = tempfile.mkdtemp(prefix='emclpy_bench_')
+    try:
+        for mode in options.modes.split(','):
+            for name, benchmark in BENCHMARKS:
+                os.environ['FAKE_EMCLI_STATE'] = os.path.join(
+                    options.state_dir, '{0}_{1}.json'.format(mode, name))
+                value, unit = benchmark(mode, options)
+                print('{0:8} {1:18} {2:14.3f} {3}'.format(mode, name,
+                                                          value, unit))
+    finally:
+        shutil.rmtree(options.state_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,26 +11,209 @@ __version__ = '1.0.0'
 
 import subprocess
 import os
+import signal
 import tempfile
+import threading
+import time
+import io
+import logging
 
-def command_runner(command):
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from .stats import Stats, redact
+
+logger = logging.getLogger(__name__)
+
+# Default number of bytes of stdout/stderr held in memory per stream before
+# spilling to a temporary file when command_runner is asked to spool output.
+SPILL_THRESHOLD = 8 * 1024 * 1024
+
+# Read only verbs that are safe to run twice at once when hedging.
+HEDGED_VERBS = ('get_targets', 'get_groups', 'get_group_members',
+                'show_patch_plan')
+
+
+def _drain(pipe, sink, timings, name, chunk_size=65536):
+    """ Copies a process pipe into a sink file in fixed size chunks so
+        only one chunk is held in memory at a time.  The time of the
+        first chunk and the byte count are stored in timings under
+        name + '_first_byte' and name + '_bytes'.
+    """
+
+    size = 0
+    for chunk in iter(lambda: pipe.read(chunk_size), b''):
+        if not size:
+            timings[name + '_first_byte'] = time.time()
+        size += len(chunk)
+        sink.write(chunk)
+    timings[name + '_bytes'] = size
+    pipe.close()
+
+
+def iter_lines(output):
+    """ Iterates over the lines of command output without loading all of
+        it into memory when it has been spooled.
+
+        Inputs:
+            output - string or file object returned by command_runner
+
+        Returns:
+            generator of lines with trailing newlines stripped.  Blank
+            lines are skipped.
+    """
+
+    if isinstance(output, basestring):
+        lines = output.split('\n')
+    else:
+        output.seek(0)
+        lines = output
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.strip():
+            yield line
+
+
+def close_output(result):
+    """ Closes the spooled out and err file objects of a command_runner
+        result, releasing any temporary file behind them.  String output
+        is left alone.
+
+        Inputs:
+            result - list, [code, out, err] from command_runner
+    """
+
+    for output in result[1:]:
+        if not isinstance(output, basestring):
+            output.close()
+
+
+def _copy_targets(targets):
+    """ Copies a get_targets result so callers cannot change the cache. """
+
+    return dict((name, dict(record)) for name, record in targets.items())
+
+
+def format_targets(targets):
+    """ Formats (target name, target type) tuples the way emcli expects
+        them in -add_targets and -delete_targets.
+
+        Inputs:
+            targets - list, (target name, target type) tuples
+
+        Returns:
+            string, "name:type;name:type"
+    """
+
+    return ';'.join('{}:{}'.format(name, target_type)
+                    for name, target_type in targets)
+
+
+def _argfile_arg(arg):
+    """ Quotes the value of an -option=value argument for an argfile. """
+
+    option, separator, value = arg.partition('=')
+    if not separator:
+        return arg
+    return '{}="{}"'.format(option, value.replace('"', '\\"'))
+
+
+def command_runner(command, spill_threshold=None, timings=None, env=None,
+                   timeout=None, cancel=None):
     """ command_runner function to simplify OS command execution.
 
         Inputs:
             list of command and arguments.
+            spill_threshold - int, when set, stdout and stderr are kept in
+                memory up to this many bytes each and then spilled to a
+                temporary file.  Defaults to None (capture in memory).
+            timings - dict, when given it is filled with 'start', 'end',
+                'stdout_first_byte', 'stderr_first_byte', 'stdout_bytes'
+                and 'stderr_bytes'.  The first byte keys are only set
+                when the stream produced output.
+            env - dict, environment for the command.  Defaults to None
+                (inherit the current environment).
+            timeout - float, seconds the command may run.  On expiry the
+                command and every process it started are killed, code is
+                the negative signal number and timings['killed'] is set
+                to 'timeout'.  Defaults to None (no limit).
+            cancel - threading.Event, kills the command the same way when
+                set, with timings['killed'] set to 'cancelled'.
+                Defaults to None
 
         Returns:
             list, [code, out, err]
                 code = int, error code
                 out = string, stdout
                 err = string, stderr
+
+            When spill_threshold is set, out and err are file objects
+            positioned at the start of the output.  Use iter_lines() or
+            read() to consume them.
     """
 
+    if timings is None:
+        timings = {}
+    watched = timeout is not None or cancel is not None
     try:
+        timings['start'] = time.time()
+        # A watched command gets its own process group so the JVM that
+        # the emcli script starts can be killed along with it.
         process = subprocess.Popen(command, shell=False,
                                    stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE)
-        out, err = process.communicate()
+                                   stderr=subprocess.PIPE,
+                                   env=env,
+                                   preexec_fn=os.setsid if watched else None)
+        if spill_threshold is None:
+            out = io.BytesIO()
+            err = io.BytesIO()
+        else:
+            out = tempfile.SpooledTemporaryFile(max_size=spill_threshold,
+                                                prefix='emclpy_out_')
+            err = tempfile.SpooledTemporaryFile(max_size=spill_threshold,
+                                                prefix='emclpy_err_')
+        readers = [threading.Thread(target=_drain,
+                                    args=(process.stdout, out, timings,
+                                          'stdout')),
+                   threading.Thread(target=_drain,
+                                    args=(process.stderr, err, timings,
+                                          'stderr'))]
+        for reader in readers:
+            reader.daemon = True
+            reader.start()
+        if watched:
+            deadline = (timings['start'] + timeout if timeout is not None
+                        else None)
+            # The process can close its pipes and keep running, and a
+            # child it left behind can hold them open after it exits, so
+            # both are watched.
+            while process.poll() is None or \
+                    any(reader.is_alive() for reader in readers):
+                if cancel is not None and cancel.is_set():
+                    timings['killed'] = 'cancelled'
+                elif deadline is not None and time.time() >= deadline:
+                    timings['killed'] = 'timeout'
+                if 'killed' in timings:
+                    try:
+                        os.killpg(process.pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+                    break
+                alive = [reader for reader in readers if reader.is_alive()]
+                if alive:
+                    alive[0].join(0.05)
+                else:
+                    time.sleep(0.05)
+        for reader in readers:
+            reader.join()
+        process.wait()
+        timings['end'] = time.time()
+        if spill_threshold is None:
+            return [process.returncode, out.getvalue(), err.getvalue()]
+        out.seek(0)
+        err.seek(0)
         return [process.returncode, out, err]
     except subprocess.CalledProcessError as exception:
         print exception.output
@@ -46,13 +229,40 @@ class Emclpy(object):
             url:  The URL of the Oracle Mangement Server
             username:  An authorized username
             password:  password for username
+            spill_threshold:  bytes of verb output to keep in memory
+                before spilling to a temporary file.  Defaults to
+                SPILL_THRESHOLD.  None keeps all output in memory.
+            state_dir:  emcli configuration directory for this session.
+                Defaults to /tmp/.emcli/<username>.  Give each object
+                talking to a different OMS its own directory.
+            cache_ttl:  seconds to reuse the results of get_targets,
+                get_groups and get_group_members.  Verbs that change
+                targets or groups invalidate the affected entries.
+                Defaults to None (no caching).
+            timeout:  seconds each verb may run before it is killed, or a
+                dict of verb name to seconds.  Defaults to None (no
+                limit).
+            hedge_delay:  seconds to wait for a HEDGED_VERBS call before
+                starting a second attempt.  The first successful answer
+                is returned and the other attempt is killed.  Defaults
+                to None (no hedging).
+            hedge_url:  URL of an alternate OMS for the second attempt.
+                It gets its own session, set up by login().  Defaults to
+                None (retry against url).
 
         Returns:
             Emclpy object.
+
+        Every verb call is timed and recorded.  Use stats() to read the
+        aggregated numbers and add_pre_hook()/add_post_hook() to export
+        them as they happen.
     """
 
 
-    def __init__(self, url, username, password):
+    def __init__(self, url, username, password,
+                 spill_threshold=SPILL_THRESHOLD, state_dir=None,
+                 cache_ttl=None, timeout=None, hedge_delay=None,
+                 hedge_url=None):
         """ Constructs class variables.
 
             Class variables:
@@ -60,6 +270,16 @@ class Emclpy(object):
                 self.username = username for the session
                 self.password = password
                 self.emcli_bin = relative path for emcli executable
+                self.spill_threshold = in memory output limit for verbs
+                    that return large listings
+                self.state_dir = emcli configuration directory
+                self.verb_jars_dir = directory emcli downloads verbs to
+                self.cache_ttl = lifetime of cached read results
+                self.timeout = per verb deadline in seconds
+                self.hedge_delay = delay before hedging a read
+                self.hedge_client = Emclpy object for hedge_url
+                self.pre_hooks = callables run before each verb
+                self.post_hooks = callables run after each verb
 
         """
 
@@ -68,6 +288,228 @@ class Emclpy(object):
         self.password = password
         self.emcli_bin = os.path.join(os.path.dirname(__file__),
                                       'emcli', 'emcli')
+        self.spill_threshold = spill_threshold
+        if state_dir is None:
+            self.state_dir = os.path.abspath(
+                '/tmp/.emcli/{}'.format(username))
+            self.verb_jars_dir = os.path.abspath(
+                '/tmp/.emcli/verb_jars/{}'.format(username))
+        else:
+            self.state_dir = os.path.abspath(state_dir)
+            self.verb_jars_dir = os.path.join(self.state_dir, 'verb_jars')
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.pre_hooks = []
+        self.post_hooks = []
+        self._stats = Stats()
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self.hedge_client = None
+        if hedge_url is not None:
+            self.hedge_client = Emclpy(hedge_url, username, password,
+                                       spill_threshold,
+                                       os.path.join(self.state_dir,
+                                                    'hedge'),
+                                       timeout=timeout)
+            # Attempts against the alternate OMS count as this object's
+            self.hedge_client._stats = self._stats
+            self.hedge_client.pre_hooks = self.pre_hooks
+            self.hedge_client.post_hooks = self.post_hooks
+
+    def _run(self, command, spill_threshold=None):
+        """ Runs an emcli command, hedged when it is one of HEDGED_VERBS
+            and hedge_delay is set.
+
+            Inputs:
+                command - list, emcli executable, verb and arguments
+                spill_threshold - int, passed on to command_runner
+
+            Returns:
+                list, [code, out, err] from command_runner
+
+            An exception is raised only when every attempt raised.
+        """
+
+        if self.hedge_delay is None or command[1] not in HEDGED_VERBS:
+            return self._execute(command, spill_threshold)
+
+        answers = queue.Queue()
+        cancels = []
+
+        def attempt(client):
+            cancel = threading.Event()
+            cancels.append(cancel)
+
+            def run():
+                try:
+                    answers.put((cancel, client._execute(
+                        command, spill_threshold, cancel), None))
+                except Exception as exception:
+                    logger.debug('hedged emcli %s attempt raised %r',
+                                 command[1], exception)
+                    answers.put((cancel, None, exception))
+
+            thread = threading.Thread(target=run)
+            thread.daemon = True
+            thread.start()
+
+        attempt(self)
+        try:
+            received = [answers.get(timeout=self.hedge_delay)]
+            if received[0][2] is None:
+                return received[0][1]
+        except queue.Empty:
+            received = []
+        logger.debug('emcli %s hedged after %ss', command[1],
+                     self.hedge_delay)
+        attempt(self.hedge_client or self)
+        while len(received) < len(cancels):
+            received.append(answers.get())
+            if received[-1][2] is None and received[-1][1][0] == 0:
+                break
+        answered = [answer for answer in received if answer[2] is None]
+        if not answered:
+            raise received[0][2]
+        cancel, result, _ = answered[-1]
+        for other in cancels:
+            if other is not cancel:
+                other.set()
+        for _, other, _ in answered[:-1]:
+            close_output(other)
+        return result
+
+    def _execute(self, command, spill_threshold=None, cancel=None):
+        """ Runs an emcli command through command_runner and records its
+            statistics.  Hooks are called with credentials redacted from
+            argv; an exception raised by a hook is logged and ignored.
+
+            Inputs:
+                command - list, emcli executable, verb and arguments
+                spill_threshold - int, passed on to command_runner
+                cancel - threading.Event, passed on to command_runner
+
+            Returns:
+                list, [code, out, err] from command_runner
+        """
+
+        verb = command[1]
+        argv = redact(command)
+        for hook in self.pre_hooks:
+            try:
+                hook(verb, argv)
+            except Exception:
+                logger.exception('emclpy pre hook %r failed', hook)
+
+        timeout = self.timeout
+        if isinstance(timeout, dict):
+            timeout = timeout.get(verb)
+        timings = {}
+        env = dict(os.environ, EMCLI_STATE_DIR=self.state_dir)
+        result = command_runner(command, spill_threshold, timings, env,
+                                timeout, cancel)
+        first_bytes = [timings[key] for key in ('stdout_first_byte',
+                                                'stderr_first_byte')
+                       if key in timings]
+        call = {'verb': verb,
+                'argv': argv,
+                'code': result[0],
+                'wall_time': timings['end'] - timings['start'],
+                'first_byte': (min(first_bytes) - timings['start']
+                               if first_bytes else None),
+                'stdout_bytes': timings['stdout_bytes'],
+                'stderr_bytes': timings['stderr_bytes'],
+                'killed': timings.get('killed')}
+        self._stats.record(call)
+        logger.debug('emcli %s exited %s in %.3fs (%d/%d bytes)', verb,
+                     call['code'], call['wall_time'], call['stdout_bytes'],
+                     call['stderr_bytes'])
+
+        for hook in self.post_hooks:
+            try:
+                hook(call)
+            except Exception:
+                logger.exception('emclpy post hook %r failed', hook)
+        return result
+
+    def add_pre_hook(self, hook):
+        """ Registers a callable run before every verb.
+
+            Inputs:
+                hook - callable, called as hook(verb, argv) where argv
+                    is the command list with credentials redacted
+        """
+
+        self.pre_hooks.append(hook)
+
+    def add_post_hook(self, hook):
+        """ Registers a callable run after every verb.
+
+            Inputs:
+                hook - callable, called as hook(call) where call is the
+                    dict described in emclpy.stats.Stats.record
+        """
+
+        self.post_hooks.append(hook)
+
+    def _cache_get(self, key):
+        """ Returns the cached value for key, or None if caching is off,
+            the key is missing or it has expired.
+        """
+
+        if self.cache_ttl is None:
+            return None
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        if entry is None or time.time() - entry[0] > self.cache_ttl:
+            return None
+        return entry[1]
+
+    def _cache_put(self, key, value):
+        """ Stores value under key when caching is on. """
+
+        if self.cache_ttl is not None:
+            with self._cache_lock:
+                self._cache[key] = (time.time(), value)
+
+    def invalidate(self, verb=None, match=None):
+        """ Drops cached read results.
+
+            Inputs:
+                verb - string, 'get_targets', 'get_groups' or
+                    'get_group_members'.  Defaults to None (every verb)
+                match - callable, called as match(key, value) to select
+                    entries, where key is a tuple of the verb and its
+                    arguments.  Defaults to None (every entry)
+        """
+
+        with self._cache_lock:
+            for key, (stamp, value) in list(self._cache.items()):
+                if verb is not None and key[0] != verb:
+                    continue
+                if match is None or match(key, value):
+                    del self._cache[key]
+
+    def stats(self):
+        """ Returns per verb statistics for the calls made so far.
+
+            Returns:
+                dict, keyed by verb.  Each entry contains:
+                    'calls' - int, number of calls
+                    'exit_codes' - dict, exit code to number of calls
+                    'stdout_bytes' - int, total bytes of stdout
+                    'stderr_bytes' - int, total bytes of stderr
+                    'wall_time' - dict, histogram of call duration
+                    'first_byte' - dict, histogram of time to first
+                        output byte, which is dominated by JVM startup
+        """
+
+        return self._stats.snapshot()
+
+    def reset_stats(self):
+        """ Clears the statistics returned by stats(). """
+
+        self._stats.reset()
 
     def login(self):
         """ login class method operates on the class object to set up the
@@ -85,8 +527,8 @@ class Emclpy(object):
         """
 
         # Create directory for emcli user environment if it doesn't exist
-        user_dir = os.path.abspath('/tmp/.emcli/{}'.format(self.username))
-        verb_jars_dir = os.path.abspath('/tmp/.emcli/verb_jars/{}'.format(self.username))
+        user_dir = self.state_dir
+        verb_jars_dir = self.verb_jars_dir
         if not os.path.exists(user_dir):
             os.makedirs(user_dir)
         if not os.path.exists(verb_jars_dir):
@@ -102,7 +544,13 @@ class Emclpy(object):
                    '-verb_jars_dir={}'.format(verb_jars_dir),
                    '-trustall',
                    '-certans=yes']
-        return command_runner(command)
+        result = self._run(command)
+        if self.hedge_client is not None:
+            self.hedge_client.emcli_bin = self.emcli_bin
+            if self.hedge_client.login()[0] != 0:
+                logger.warning('login to hedge OMS %s failed',
+                               self.hedge_client.url)
+        return result
 
 
     def logout(self):
@@ -120,7 +568,7 @@ class Emclpy(object):
         """
 
         command = [self.emcli_bin, 'logout']
-        return command_runner(command)
+        return self._run(command)
 
     def sync(self):
         """ sync class method operates on the class object to syncronize the
@@ -137,7 +585,7 @@ class Emclpy(object):
                     err = string, stderr
         """
         command = [self.emcli_bin, 'sync']
-        return command_runner(command)
+        return self._run(command)
 
     def create_generic_service(self, service_name, input_file, beacon_list,
                                time_zone='America/New_York'):
@@ -171,7 +619,10 @@ class Emclpy(object):
                    '-timezone_region={}'.format(time_zone),
                    '-input_file=template:{}'.format(input_file),
                    '-beacons={}'.format(beacons)]
-        return command_runner(command)
+        result = self._run(command)
+        self.invalidate('get_targets', lambda key, value: key[1] in (
+            None, 'generic_service'))
+        return result
 
     def apply_template(self, template_name, target_name,
                        target_type='generic_service'):
@@ -198,7 +649,7 @@ class Emclpy(object):
                    'apply_template',
                    '-name={}'.format(template_name),
                    '-targets={}:{}'.format(target_name, target_type)]
-        return command_runner(command)
+        return self._run(command)
 
     def set_target_property_value(self, target_name, target_type,
                                   property_records):
@@ -228,7 +679,61 @@ class Emclpy(object):
         command = [self.emcli_bin,
                    'set_target_property_value',
                    '-property_records={}'.format(properties)]
-        return command_runner(command)
+        return self._run(command)
+
+    def set_target_property_records(self, records):
+        """ Sets property values on several targets in one call.
+
+            Inputs:
+                records - list, (target name, target type, property name,
+                    property value) tuples
+
+            Returns:
+                 list, [code, out, err]
+                    code = int, error code
+                    out = string, stdout
+                    err = string, stderr
+        """
+
+        properties = ';'.join('{}:{}:{}:{}'.format(*record)
+                              for record in records)
+        command = [self.emcli_bin,
+                   'set_target_property_value',
+                   '-property_records={}'.format(properties)]
+        return self._run(command)
+
+    def _iter_read(self, command, status=None):
+        """ Runs a read verb with its output spooled past spill_threshold
+            and yields its stdout lines.  Nothing is yielded when the
+            call exits non zero or is killed, since its output may stop
+            part way through a record.  The spooled files are closed
+            once the lines are consumed or the generator is discarded.
+
+            Inputs:
+                command - list, emcli executable, verb and arguments
+                status - dict, filled with 'code' and 'err' before the
+                    first line is yielded.  Defaults to None
+
+            Returns:
+                generator of lines, see iter_lines()
+        """
+
+        result = self._run(command, self.spill_threshold)
+        try:
+            err = result[2]
+            if not isinstance(err, basestring):
+                err = err.read()
+            if status is not None:
+                status['code'] = result[0]
+                status['err'] = err
+            if result[0] != 0:
+                logger.warning('emcli %s exited %s, output ignored: %s',
+                               command[1], result[0], err.strip())
+                return
+            for line in iter_lines(result[1]):
+                yield line
+        finally:
+            close_output(result)
 
     def get_targets(self, target_type=None, target_name=None):
         """ Retrieves a list of targets managed by OEM.  It no input
@@ -260,6 +765,36 @@ class Emclpy(object):
             This would return the string 'host'
         """
 
+        key = ('get_targets', target_type, target_name)
+        cached = self._cache_get(key)
+        if cached is not None:
+            code, targets, err = cached
+            return code, _copy_targets(targets), err
+        status = {}
+        targets = dict(self.iter_targets(target_type, target_name, status))
+        if status['code'] == 0:
+            self._cache_put(key, (status['code'], _copy_targets(targets),
+                                  status['err']))
+        return status['code'], targets, status['err']
+
+    def iter_targets(self, target_type=None, target_name=None, status=None):
+        """ Generator form of get_targets.  Records are read one line at
+            a time from the spooled output, so memory stays bounded no
+            matter how many targets the OMS returns.  Results are not
+            cached.
+
+            Inputs:
+               target_type - string, OEM target type.  Default = None
+               target_name - string, OEM target name.  Default = None
+               status - dict, when given it is filled with 'code' and
+                   'err' of the emcli call before the first record is
+                   yielded.  Default = None
+
+            Returns:
+                generator of (target name, dict) tuples.  The dict is
+                the one described in get_targets.
+        """
+
         if target_type is None and target_name is None:
             command = [self.emcli_bin,
                        'get_targets',
@@ -281,19 +816,23 @@ class Emclpy(object):
                        '-alerts',
                        '-noheader']
         else:
-            return [1, {}, 'ERROR: target_name must include target_type']
-        targets = {}
-        code, out, err = command_runner(command)
+            if status is not None:
+                status['code'] = 1
+                status['err'] = 'ERROR: target_name must include target_type'
+            return
 
         # Loooping through get_targets output and building data structure
-        for line in out.strip().split('\n'):
+        for line in self._iter_read(command, status):
             record = line.split(',')
-            targets[record[3]] = {'status_id': record[0],
-                                  'status': record[1],
-                                  'target_type': record[2],
-                                  'critical': record[4],
-                                  'warning': record[5]}
-        return code, targets, err
+            if len(record) < 6:
+                logger.warning('skipping malformed get_targets line %r',
+                               line)
+                continue
+            yield record[3], {'status_id': record[0],
+                              'status': record[1],
+                              'target_type': record[2],
+                              'critical': record[4],
+                              'warning': record[5]}
 
     def delete_target(self, target_name, target_type,
                       delete_monitored_targets=False):
@@ -327,53 +866,124 @@ class Emclpy(object):
                        'delete_target',
                        '-name={}'.format(target_name),
                        '-type={}'.format(target_type)]
-        return command_runner(command)
+        result = self._run(command)
+        if delete_monitored_targets:
+            self.invalidate('get_targets')
+            self.invalidate('get_group_members')
+        else:
+            self.invalidate('get_targets', lambda key, value: key[1] in (
+                None, target_type))
+            self.invalidate('get_group_members', lambda key, value: (
+                target_name, target_type) in value)
+        return result
 
-    def get_groups(self):
+    def get_groups(self, status=None):
         """ Get all the existing groups as a list.
 
             Inputs:
-                None
+                status - dict, when given it is filled with 'code' and
+                    'err' of the emcli call.  A failed or killed call
+                    returns no groups.  Defaults to None
 
             Returns:
                 groups - list, a list of group name
         """
 
-        groups = []
+        cached = self._cache_get(('get_groups',))
+        if cached is not None:
+            if status is not None:
+                status.update(code=0, err='')
+            return list(cached)
+        if status is None:
+            status = {}
+        groups = list(self.iter_groups(status))
+        if status['code'] == 0:
+            self._cache_put(('get_groups',), list(groups))
+        return groups
+
+    def iter_groups(self, status=None):
+        """ Generator form of get_groups that reads the spooled output
+            one line at a time.  Results are not cached.
+
+            Inputs:
+                status - dict, when given it is filled with 'code' and
+                    'err' of the emcli call before the first group is
+                    yielded.  Defaults to None
+
+            Returns:
+                generator of group names
+        """
+
         command = [self.emcli_bin,
                    'get_groups',
                    '-noheader',
                    '-format=name:csv']
-        result = command_runner(command)
-        for group in result[1].strip().split('\n'):
-           groups.append(group.split(',')[0])
-        return groups
+        for group in self._iter_read(command, status):
+            yield group.split(',')[0]
 
-    def get_group_members(self, group_name):
+    def get_group_members(self, group_name, include_type=False,
+                          status=None):
         """ Get a list member targets belonging to a group.
 
             Inputs:
                 group_name - String, name of the group.
+                include_type - Bool, return (target name, target type)
+                    tuples instead of target names.  Defaults to False
+                status - dict, when given it is filled with 'code' and
+                    'err' of the emcli call.  A failed or killed call
+                    returns no members.  Defaults to None
 
             Returns:
                 targets - List, A list of targets belonging to group_name
         """
-        targets = []
+        key = ('get_group_members', group_name)
+        members = self._cache_get(key)
+        if members is not None and status is not None:
+            status.update(code=0, err='')
+        if members is None:
+            if status is None:
+                status = {}
+            members = list(self.iter_group_members(group_name, status))
+            if status['code'] == 0:
+                self._cache_put(key, members)
+        if include_type:
+            return list(members)
+        return [target[0] for target in members]
+
+    def iter_group_members(self, group_name, status=None):
+        """ Generator form of get_group_members that reads the spooled
+            output one line at a time.  Results are not cached.
+
+            Inputs:
+                group_name - String, name of the group.
+                status - dict, when given it is filled with 'code' and
+                    'err' of the emcli call before the first member is
+                    yielded.  Defaults to None
+
+            Returns:
+                generator of (target name, target type) tuples
+        """
+
         command = [self.emcli_bin,
                    'get_group_members',
                    '-name={}'.format(group_name),
                    '-noheader',
                    '-format=name:csv']
-        result = command_runner(command)
-        for target in result[1].strip().split('\n'):
-            targets.append(target.split(',')[0])
-        return targets
-
-    def create_group(self, group_name):
+        for target in self._iter_read(command, status):
+            record = target.split(',')
+            if len(record) < 2:
+                logger.warning('skipping malformed get_group_members line '
+                               '%r', target)
+                continue
+            yield record[0], record[1]
+
+    def create_group(self, group_name, members=None):
         """ Create a new group
 
             Inputs:
                 group_name - String, group_name
+                members - List, (target name, target type) tuples to add
+                    to the new group.  Defaults to None
 
             Returns:
                 list, [code, out, err]
@@ -386,7 +996,13 @@ class Emclpy(object):
         command = [self.emcli_bin,
                    'create_group',
                    '-name={}'.format(group_name)]
-        return command_runner(command)
+        if members:
+            command.append('-add_targets={}'.format(format_targets(members)))
+        result = self._run(command)
+        self.invalidate('get_groups')
+        self.invalidate('get_group_members',
+                        lambda key, value: key[1] == group_name)
+        return result
 
     def add_to_group(self, group_name, target_name, target_type):
         """ Adds a target to a group.
@@ -407,7 +1023,42 @@ class Emclpy(object):
                    'modify_group',
                    '-name={}'.format(group_name),
                    '-add_targets={}:{}'.format(target_name, target_type)]
-        return command_runner(command)
+        result = self._run(command)
+        self.invalidate('get_group_members',
+                        lambda key, value: key[1] == group_name)
+        return result
+
+    def modify_group(self, group_name, add_targets=None,
+                     delete_targets=None):
+        """ Adds and removes several group members in one call.
+
+            Inputs:
+                group_name - String, Name of group to modify
+                add_targets - List, (target name, target type) tuples to
+                    add.  Defaults to None
+                delete_targets - List, (target name, target type) tuples
+                    to remove.  Defaults to None
+
+            Returns:
+                list, [code, out, err]
+                    code = int, error code
+                    out = string, stdout
+                    err = string, stderr
+        """
+
+        command = [self.emcli_bin,
+                   'modify_group',
+                   '-name={}'.format(group_name)]
+        if add_targets:
+            command.append('-add_targets={}'.format(
+                format_targets(add_targets)))
+        if delete_targets:
+            command.append('-delete_targets={}'.format(
+                format_targets(delete_targets)))
+        result = self._run(command)
+        self.invalidate('get_group_members',
+                        lambda key, value: key[1] == group_name)
+        return result
 
     def delete_group(self, group_name):
         """ Deletes a group from OEM.
@@ -425,26 +1076,113 @@ class Emclpy(object):
         command = [self.emcli_bin,
                    'delete_group',
                    '-name={}'.format(group_name)]
-        return command_runner(command)
+        result = self._run(command)
+        self.invalidate('get_groups')
+        self.invalidate('get_group_members',
+                        lambda key, value: key[1] == group_name)
+        return result
+
+    def argfile(self, commands):
+        """ Runs several verbs in a single emcli process with the argfile
+            verb, paying the JVM startup cost once.  Output of the verbs
+            is concatenated in order.
+
+            Inputs:
+                commands - list, each a list of verb and arguments without
+                    the emcli executable, e.g. ['sync']
+
+            Returns:
+                list, [code, out, err]
+                    code = int, error code
+                    out = string, stdout
+                    err = string, stderr
+        """
+
+        handle, path = tempfile.mkstemp(prefix='emclpy_argfile_')
+        try:
+            with os.fdopen(handle, 'w') as args:
+                for command in commands:
+                    args.write(' '.join(_argfile_arg(arg)
+                                        for arg in command) + '\n')
+            return self._run([self.emcli_bin, 'argfile', path])
+        finally:
+            os.remove(path)
+
+    def create_patch_plan(self, plan_name, input_file,
+                          impact_other_targets=None):
+        """ Creates a patch plan.
+
+            Inputs:
+                plan_name - string, name of the new plan
+                input_file - string, file name of the plan properties
+                    file (see emcli describe_patch_plan_input)
+                impact_other_targets - string, 'add_all', 'add_none' or
+                    'cancel'.  Defaults to None (the OMS default)
+
+            Returns:
+                list, [code, out, err]
+                    code = int, error code
+                    out = string, stdout
+                    err = string, stderr
+        """
+
+        command = [self.emcli_bin,
+                   'create_patch_plan',
+                   '-name={}'.format(plan_name),
+                   '-input_file=data:{}'.format(input_file)]
+        if impact_other_targets is not None:
+            command.append('-impact_other_targets={}'.format(
+                impact_other_targets))
+        return self._run(command)
+
+    def show_patch_plan(self, plan_name):
+        """ Shows the summary of a patch plan, including its status.
+
+            Inputs:
+                plan_name - string, patch plan name
+
+            Returns:
+                list, [code, out, err]
+                    code = int, error code
+                    out = string, stdout
+                    err = string, stderr
+        """
+
+        command = [self.emcli_bin,
+                   'show_patch_plan',
+                   '-name={}'.format(plan_name),
+                   '-info']
+        return self._run(command)
+
+    def submit_patch_plan(self, plan_name, action='analyze'):
+        """ Submits a patch plan for an action.
+
+            Inputs:
+                plan_name - string, patch plan name
+                action - string, 'analyze', 'prepare', 'deploy' or
+                    'switchBack'.  Defaults to 'analyze'
+
+            Returns:
+                list, [code, out, err]
+                    code = int, error code
+                    out = string, stdout
+                    err = string, stderr
+        """
+
+        command = [self.emcli_bin,
+                   'submit_patch_plan',
+                   '-name={}'.format(plan_name),
+                   '-action={}'.format(action)]
+        return self._run(command)
 
 
 
-# TODO:  Add logging
 # TODO:  Test @today
 
     # Below are for furture functions
     #def create_system(self):
     #    return
 #
-#    def create_patch_plan(self):
-#        return
-#
-#    def show_patch_plan(self):
-#        return
-#
-#    def submit_patch_Plan(self):
-#        return
-#
 #    def set_metric_promotion(self):
 #        return
 
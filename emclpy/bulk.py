@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+""" Checkpointed, resumable bulk operations for Emclpy, and bulk
+    target deletion.
+
+    A bulk run is a list of jobs.  Each job is an ordered list of steps,
+    and each step is one Emclpy method call.  Every step that succeeds
+    is appended to a journal file.  If the run is restarted with the same
+    journal, those steps are skipped.  A failed step is retried with
+    exponential backoff while the other jobs carry on.
+
+    delete_targets removes many targets in parallel, in waves ordered by
+    target type and by any dependencies the caller supplies.
+"""
+
+import collections
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Phase in which delete_targets removes each target type.  Composite
+# targets go before their members, members before the hosts they run
+# on and hosts before their agents.  Types not listed are members
+# (phase 1).  Pass phases to delete_targets to extend or override this.
+DELETE_PHASES = {'composite': 0,
+                 'generic_service': 0,
+                 'generic_system': 0,
+                 'rac_database': 0,
+                 'cluster': 0,
+                 'oracle_pdb': 0,
+                 'host': 2,
+                 'oracle_emd': 3}
+
+# A single Emclpy call.  name identifies the step within its job in the
+# journal, method is the Emclpy method name and kwargs its arguments.
+# accept holds stderr fragments, such as 'already exists', that mean an
+# earlier attempt of the step took effect before it could be journaled.
+# They only count when the step is retried or was started by a run that
+# crashed.
+Step = collections.namedtuple('Step', ['name', 'method', 'kwargs', 'accept'])
+Step.__new__.__defaults__ = ((),)
+
+
+class Job(object):
+    """ An ordered list of steps run against one Emclpy object.
+
+        Inputs:
+            key - string, unique name of the job within the run
+            steps - list of Step
+    """
+
+    def __init__(self, key, steps):
+        self.key = key
+        self.steps = list(steps)
+
+
+def onboarding_job(service_name, input_file, beacon_list, template_name,
+                   group_name, time_zone='America/New_York'):
+    """ Builds the create_generic_service, apply_template, add_to_group
+        job used to onboard a generic service.
+
+        Inputs:
+            service_name - string, generic service name
+            input_file - string, file name of xml file
+            beacon_list - list, a list of OEM beacons
+            template_name - string, monitoring template to apply
+            group_name - string, group to add the service to
+            time_zone - string, formatted "Region/City"
+                        Defaults to "America/New York"
+
+        Returns:
+            Job, keyed by service_name
+    """
+
+    return Job(service_name, [
+        Step('create', 'create_generic_service',
+             {'service_name': service_name, 'input_file': input_file,
+              'beacon_list': beacon_list, 'time_zone': time_zone},
+             ('already exists',)),
+        Step('template', 'apply_template',
+             {'template_name': template_name, 'target_name': service_name,
+              'target_type': 'generic_service'}),
+        Step('group', 'add_to_group',
+             {'group_name': group_name, 'target_name': service_name,
+              'target_type': 'generic_service'})])
+
+
+class Journal(object):
+    """ Append only log of started and finished steps, one JSON object
+        per line.
+
+        Inputs:
+            path - string, journal file name.  Created if missing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def completed(self, status='done'):
+        """ Returns the set of (job key, step name) recorded with status.
+            A torn last line from a crash is ignored.
+        """
+
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path) as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('status') == status:
+                    done.add((entry['job'], entry['step']))
+        return done
+
+    def record(self, job, step, status, code):
+        """ Appends one entry and flushes it to disk. """
+
+        entry = json.dumps({'job': job, 'step': step, 'status': status,
+                            'code': code, 'time': time.time()})
+        with self._lock:
+            with open(self.path, 'a') as journal:
+                journal.write(entry + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+
+
+class BulkRunner(object):
+    """ Runs jobs concurrently, journals each step as it starts and
+        finishes and resumes from the journal on restart.  A step that
+        was started but never finished is run again, and its accept
+        errors count as success.
+
+        Inputs:
+            emcli - Emclpy object the steps are called on
+            journal_path - string, journal file name
+            workers - int, number of steps run at once.  Defaults to 4
+            retries - int, attempts per step before the job is marked
+                failed.  Defaults to 3
+            backoff - float, seconds before the first retry.  Doubles on
+                each further retry.  Defaults to 5.0
+
+        Returns:
+            BulkRunner object.
+    """
+
+    def __init__(self, emcli, journal_path, workers=4, retries=3,
+                 backoff=5.0):
+        self.emcli = emcli
+        self.journal = Journal(journal_path)
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+
+    def run(self, jobs):
+        """ Runs jobs until every step has succeeded or run out of
+            retries.
+
+            Inputs:
+                jobs - iterable of Job
+
+            Returns:
+                dict, keyed by job key.  Each entry contains:
+                    'status' - string, 'done', 'skipped' when the journal
+                        already had every step, or 'failed'
+                    'step' - string, name of the failed step, or None
+                    'result' - the return value of the last step run,
+                        None if nothing was run
+        """
+
+        done = self.journal.completed()
+        interrupted = self.journal.completed('started') - done
+        results = {}
+        queue = []
+        for seq, job in enumerate(jobs):
+            pending = [step for step in job.steps
+                       if (job.key, step.name) not in done]
+            if not pending:
+                results[job.key] = {'status': 'skipped', 'step': None,
+                                    'result': None}
+                continue
+            # queue entries are [ready time, sequence, job, pending, attempt]
+            queue.append([0, seq, job, pending, 1])
+        heapq.heapify(queue)
+
+        state = {'queue': queue, 'active': 0, 'interrupted': interrupted}
+        condition = threading.Condition()
+        threads = [threading.Thread(target=self._worker,
+                                    args=(state, condition, results))
+                   for _ in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _worker(self, state, condition, results):
+        """ Takes ready entries off the queue until it is empty and no
+            other worker can add to it.
+        """
+
+        while True:
+            with condition:
+                while True:
+                    queue = state['queue']
+                    if not queue and not state['active']:
+                        condition.notify_all()
+                        return
+                    delay = queue[0][0] - time.time() if queue else None
+                    if delay is not None and delay <= 0:
+                        entry = heapq.heappop(queue)
+                        state['active'] += 1
+                        break
+                    condition.wait(delay)
+
+            ready, seq, job, pending, attempt = entry
+            step = pending[0]
+            entry = None
+            try:
+                entry = self._step(job, seq, pending, attempt, results,
+                                   state['interrupted'])
+            except Exception:
+                # Journal failures land here; the job cannot be resumed
+                # reliably, so it is reported as failed.
+                logger.exception('bulk step %s/%s could not be recorded',
+                                 job.key, step.name)
+                results[job.key] = {'status': 'failed', 'step': step.name,
+                                    'result': None}
+            finally:
+                with condition:
+                    if entry is not None:
+                        heapq.heappush(state['queue'], entry)
+                    state['active'] -= 1
+                    condition.notify_all()
+
+    def _step(self, job, seq, pending, attempt, results, interrupted):
+        """ Runs the first pending step of job and journals the outcome.
+            interrupted is the set of (job key, step name) that a
+            previous run started but did not finish.
+
+            Returns:
+                the queue entry to run next for this job, or None when the
+                job is finished and its result has been stored
+        """
+
+        step = pending[0]
+        if attempt == 1:
+            self.journal.record(job.key, step.name, 'started', None)
+        try:
+            result = getattr(self.emcli, step.method)(**step.kwargs)
+            code = result[0]
+        except Exception:
+            logger.exception('bulk step %s/%s raised', job.key, step.name)
+            result, code = None, None
+
+        if code not in (0, None) and step.accept and (
+                attempt > 1 or (job.key, step.name) in interrupted) and \
+                any(text in str(result[2]) for text in step.accept):
+            logger.info('bulk step %s/%s already took effect: %s', job.key,
+                        step.name, str(result[2]).strip())
+            code = 0
+        if code == 0:
+            self.journal.record(job.key, step.name, 'done', code)
+            if len(pending) > 1:
+                return [0, seq, job, pending[1:], 1]
+            results[job.key] = {'status': 'done', 'step': None,
+                                'result': result}
+            return None
+        if attempt < self.retries:
+            logger.warning('bulk step %s/%s failed with %s, attempt %d',
+                           job.key, step.name, code, attempt)
+            return [time.time() + self.backoff * 2 ** (attempt - 1),
+                    seq, job, pending, attempt + 1]
+        self.journal.record(job.key, step.name, 'failed', code)
+        results[job.key] = {'status': 'failed', 'step': step.name,
+                            'result': result}
+        return None
+
+
+def delete_order(targets, phases=None, depends_on=None):
+    """ Groups targets into waves that can be deleted in parallel.
+
+        Inputs:
+            targets - list, (target name, target type, ...) tuples
+            phases - dict, target type to phase, merged over
+                DELETE_PHASES.  Defaults to None
+            depends_on - dict, (target name, target type) to the
+                (target name, target type) tuples that must be deleted
+                before it, e.g. a cluster's hosts after the cluster.
+                Defaults to None
+
+        Returns:
+            list of lists of targets, in deletion order
+
+        Raises ValueError if depends_on has a cycle.
+    """
+
+    type_phases = dict(DELETE_PHASES)
+    type_phases.update(phases or {})
+    depends_on = depends_on or {}
+    by_key = dict(((target[0], target[1]), target) for target in targets)
+    levels = {}
+
+    def level(key, path):
+        if key in levels:
+            return levels[key]
+        if key in path:
+            raise ValueError('dependency cycle at {}:{}'.format(*key))
+        value = type_phases.get(key[1], 1)
+        for before in depends_on.get(key, ()):
+            before = tuple(before)
+            if before in by_key:
+                value = max(value, level(before, path + (key,)) + 1)
+        levels[key] = value
+        return value
+
+    waves = {}
+    for key, target in by_key.items():
+        waves.setdefault(level(key, ()), []).append(target)
+    return [waves[index] for index in sorted(waves)]
+
+
+def delete_targets(emcli, targets, workers=8, phases=None,
+                   depends_on=None):
+    """ Deletes many targets, dependents before the hosts and agents they
+        run on, with up to workers deletions at once.  Targets are
+        ordered by delete_order() and each wave finishes before the
+        next one starts.  Cached reads on emcli are invalidated by
+        Emclpy.delete_target.
+
+        A target is skipped, not deleted, when a target it depends_on
+        failed or was skipped.  An agent deleted with its monitored
+        targets is skipped once any earlier deletion failed, since it
+        could take the failed target down with it.
+
+        Inputs:
+            emcli - Emclpy object
+            targets - iterable, (target name, target type) or (target
+                name, target type, delete_monitored_targets) tuples
+            workers - int, concurrent deletions.  Defaults to 8
+            phases, depends_on - passed on to delete_order()
+
+        Returns:
+            dict, (target name, target type) to the [code, out, err]
+            returned by delete_target.  code is None when the call
+            raised or the target was skipped.
+    """
+
+    depends_on = depends_on or {}
+    results = {}
+    for wave in delete_order(list(targets), phases, depends_on):
+        failed = sorted(key for key, result in results.items()
+                        if result[0] != 0)
+        pending = []
+        for target in reversed(wave):
+            key = (target[0], target[1])
+            blockers = [tuple(before) for before in depends_on.get(key, ())
+                        if tuple(before) in failed]
+            if not blockers and len(target) > 2 and target[2]:
+                blockers = failed
+            if blockers:
+                logger.warning('skipping delete of %s:%s, %s:%s was not '
+                               'deleted', key[0], key[1], *blockers[0])
+                results[key] = [None, '', 'skipped, {}:{} was not '
+                                'deleted'.format(*blockers[0])]
+            else:
+                pending.append(target)
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    target = pending.pop()
+                try:
+                    result = emcli.delete_target(*target)
+                except Exception as exception:
+                    logger.exception('delete of %s:%s raised', target[0],
+                                     target[1])
+                    result = [None, '', str(exception)]
+                results[(target[0], target[1])] = result
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(min(workers, len(pending)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return results
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+""" emclpy command line batch runner.
+
+    Reads operations as JSON lines from a file or stdin, runs them
+    through Emclpy on a pool of workers and writes one JSON line per
+    result as soon as it completes.  Input is read as it is consumed,
+    so arbitrarily long streams run in constant memory.
+
+    An operation looks like:
+
+        {"id": 1, "verb": "add_to_group",
+         "args": {"group_name": "G", "target_name": "h",
+                  "target_type": "host"}}
+
+    "verb" is an Emclpy method name, "args" its keyword arguments and
+    "id" is optional and copied to the result.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from . import Emclpy, SPILL_THRESHOLD
+
+# Emclpy methods that do not make sense as batch operations.
+EXCLUDED_VERBS = ('add_pre_hook', 'add_post_hook', 'invalidate',
+                  'reset_stats', 'stats')
+
+# Marks the end of the input stream on the work queue.
+_DONE = object()
+
+
+def to_result(operation, value):
+    """ Turns an Emclpy return value into a JSON serializable result.
+
+        Inputs:
+            operation - dict, the operation that was run
+            value - the value its Emclpy method returned
+
+        Returns:
+            dict with 'id', 'verb' and either 'code', 'out' and 'err'
+            for [code, out, err] style returns, or 'result'
+    """
+
+    result = {'id': operation.get('id'), 'verb': operation.get('verb')}
+    if isinstance(value, (list, tuple)) and len(value) == 3 and \
+            isinstance(value[0], int):
+        result['code'], result['out'], result['err'] = value
+    else:
+        result['result'] = value
+    return result
+
+
+def dumps(result):
+    """ Serializes a result as one JSON line.  Output that is not UTF-8
+        is decoded with replacement characters, and a result that still
+        cannot be serialized becomes an error record.
+    """
+
+    try:
+        return json.dumps(result)
+    except (TypeError, ValueError):
+        pass
+    result = dict((key, value.decode('utf-8', 'replace')
+                   if isinstance(value, str) else value)
+                  for key, value in result.items())
+    try:
+        return json.dumps(result)
+    except (TypeError, ValueError) as exception:
+        return json.dumps({'id': result.get('id'),
+                           'verb': result.get('verb'),
+                           'error': 'unserializable result: {}'.format(
+                               exception)})
+
+
+def run_operation(emcli, operation):
+    """ Runs one operation and returns its result dict. """
+
+    verb = operation.get('verb')
+    if not isinstance(verb, basestring) or verb.startswith('_') or \
+            verb in EXCLUDED_VERBS or not callable(getattr(emcli, verb,
+                                                           None)):
+        return {'id': operation.get('id'), 'verb': verb,
+                'error': 'unknown verb {!r}'.format(verb)}
+    try:
+        return to_result(operation,
+                         getattr(emcli, verb)(**operation.get('args', {})))
+    except Exception as exception:
+        return {'id': operation.get('id'), 'verb': verb,
+                'error': '{}: {}'.format(type(exception).__name__,
+                                         exception)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='emclpy',
+        description='Run emcli operations streamed as JSON lines.')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='file of JSON line operations, - for stdin')
+    parser.add_argument('-o', '--output', default='-',
+                        help='file for JSON line results, - for stdout')
+    parser.add_argument('--url', required=True,
+                        help='URL of the Oracle Management Server')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password',
+                        default=os.environ.get('EMCLPY_PASSWORD'),
+                        help='defaults to $EMCLPY_PASSWORD')
+    parser.add_argument('--state-dir',
+                        help='emcli state directory for this session')
+    parser.add_argument('--emcli-bin', help='emcli executable')
+    parser.add_argument('-j', '--workers', type=int, default=4,
+                        help='operations run at once (default 4)')
+    parser.add_argument('--login', action='store_true',
+                        help='run login and sync before the operations')
+    parser.add_argument('--stats', action='store_true',
+                        help='write per verb statistics to stderr at exit')
+    options = parser.parse_args(argv)
+    if options.password is None:
+        parser.error('no password, use --password or set $EMCLPY_PASSWORD')
+    return options
+
+
+def main(argv=None):
+    """ Entry point of the emclpy console script. """
+
+    options = parse_args(argv)
+    emcli = Emclpy(options.url, options.username, options.password,
+                   spill_threshold=SPILL_THRESHOLD,
+                   state_dir=options.state_dir)
+    if options.emcli_bin:
+        emcli.emcli_bin = options.emcli_bin
+    if options.login:
+        for step in (emcli.login, emcli.sync):
+            code, out, err = step()
+            if code != 0:
+                sys.stderr.write(err)
+                return code
+
+    source = sys.stdin if options.input == '-' else open(options.input)
+    sink = sys.stdout if options.output == '-' else open(options.output,
+                                                         'w')
+    work = queue.Queue(options.workers * 2)
+    write_lock = threading.Lock()
+    failures = [0]
+
+    def write(result):
+        with write_lock:
+            if 'error' in result or result.get('code') not in (None, 0):
+                failures[0] += 1
+            sink.write(dumps(result) + '\n')
+            sink.flush()
+
+    def worker():
+        for operation in iter(work.get, _DONE):
+            try:
+                write(run_operation(emcli, operation))
+            except Exception as exception:
+                with write_lock:
+                    failures[0] += 1
+                sys.stderr.write('emclpy: operation {!r} failed: {}\n'.format(
+                    operation.get('id'), exception))
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(options.workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    for number, line in enumerate(iter(source.readline, ''), 1):
+        if not line.strip():
+            continue
+        try:
+            operation = json.loads(line)
+            if not isinstance(operation, dict):
+                raise ValueError('operation must be a JSON object')
+        except ValueError as exception:
+            write({'id': None, 'verb': None,
+                   'error': 'line {}: {}'.format(number, exception)})
+            continue
+        work.put(operation)
+    for _ in threads:
+        work.put(_DONE)
+    for thread in threads:
+        thread.join()
+
+    if options.stats:
+        sys.stderr.write(json.dumps(emcli.stats()) + '\n')
+    if source is not sys.stdin:
+        source.close()
+    if sink is not sys.stdout:
+        sink.close()
+    return 1 if failures[0] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+""" Concurrent reads across several Oracle Management Servers.
+
+    Each site gets its own Emclpy object with its own emcli state
+    directory, so the sessions cannot interfere.  Calls go to every
+    site at once and the results are merged and tagged with the site
+    name.  A site that fails or runs past the timeout is reported in
+    the failures and left out of the merged results.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from . import Emclpy
+
+logger = logging.getLogger(__name__)
+
+
+class FederatedEmclpy(object):
+    """ Runs Emclpy calls against several OMS sites concurrently.
+
+        Inputs:
+            sites - dict, site name to (url, username, password) or
+                (url, username, password, timeout) for a site that needs
+                its own timeout
+            timeout - float, seconds to wait for a site to answer a call
+                unless the site sets its own.  emcli processes still
+                running after it are killed.  Defaults to 300
+            state_root - string, directory that holds one emcli state
+                directory per site.  Defaults to /tmp/.emcli/sites
+            emcli_bin - string, emcli executable.  Defaults to the one
+                Emclpy uses
+
+        Returns:
+            FederatedEmclpy object.
+    """
+
+    def __init__(self, sites, timeout=300, state_root='/tmp/.emcli/sites',
+                 emcli_bin=None):
+        self.timeout = timeout
+        self.timeouts = {}
+        self.clients = {}
+        for name, site in sites.items():
+            url, username, password = site[:3]
+            self.timeouts[name] = site[3] if len(site) > 3 else timeout
+            client = Emclpy(url, username, password,
+                            state_dir=os.path.join(state_root, name,
+                                                   username),
+                            timeout=self.timeouts[name])
+            if emcli_bin is not None:
+                client.emcli_bin = emcli_bin
+            self.clients[name] = client
+
+    def gather(self, method, *args, **kwargs):
+        """ Calls an Emclpy method on every site at once.
+
+            Inputs:
+                method - string, Emclpy method name
+                args, kwargs - passed on to the method
+
+            Returns:
+                results - dict, site name to the method's return value
+                    for every site that answered in time
+                failures - dict, site name to 'timeout' or the exception
+                    the call raised
+        """
+
+        # Site threads write here.  A thread that outlives its timeout
+        # keeps writing after gather returns, so the caller gets copies.
+        results = {}
+        errors = {}
+
+        def call(name, client):
+            try:
+                results[name] = getattr(client, method)(*args, **kwargs)
+            except Exception as exception:
+                logger.exception('%s on site %s raised', method, name)
+                errors[name] = exception
+
+        threads = {}
+        for name, client in self.clients.items():
+            thread = threading.Thread(target=call, args=(name, client))
+            thread.daemon = True
+            thread.start()
+            threads[name] = thread
+
+        start = time.time()
+        timed_out = set()
+        for name, thread in sorted(threads.items(),
+                                   key=lambda item: self.timeouts[item[0]]):
+            thread.join(max(start + self.timeouts[name] - time.time(), 0))
+            if thread.is_alive():
+                logger.warning('%s on site %s timed out', method, name)
+                timed_out.add(name)
+        failures = dict((name, error) for name, error in errors.items()
+                        if name not in timed_out)
+        failures.update((name, 'timeout') for name in timed_out)
+        return (dict((name, result) for name, result in results.items()
+                     if name not in failures), failures)
+
+    def login(self):
+        """ Logs in to every site.  See gather() for the return value. """
+
+        return self.gather('login')
+
+    def sync(self):
+        """ Syncs every site.  See gather() for the return value. """
+
+        return self.gather('sync')
+
+    def logout(self):
+        """ Logs out of every site.  See gather() for the return value. """
+
+        return self.gather('logout')
+
+    def get_targets(self, target_type=None, target_name=None):
+        """ Retrieves the targets of every site as one inventory.  See
+            Emclpy.get_targets for the inputs.
+
+            Returns:
+                targets - dict, keyed by (site name, target name).  Each
+                    entry is the dict Emclpy.get_targets returns plus
+                    'site' - string, site name
+                failures - dict, site name to the reason it is missing.
+                    A site whose emcli exited non zero maps to
+                    (code, err).
+        """
+
+        results, failures = self.gather('get_targets', target_type,
+                                        target_name)
+        targets = {}
+        for site, (code, site_targets, err) in results.items():
+            if code != 0:
+                failures[site] = (code, err)
+                continue
+            for name, record in site_targets.items():
+                record['site'] = site
+                targets[(site, name)] = record
+        return targets, failures
+
+    def get_groups(self):
+        """ Get the groups of every site.
+
+            Returns:
+                groups - list, (site name, group name) tuples
+                failures - dict, site name to the reason it is missing
+        """
+
+        results, failures = self.gather('get_groups')
+        return ([(site, group) for site in sorted(results)
+                 for group in results[site]], failures)
+
+    def get_group_members(self, group_name, include_type=False):
+        """ Get the members of group_name on every site.  See
+            Emclpy.get_group_members for the inputs.
+
+            Returns:
+                targets - list, (site name, target) tuples
+                failures - dict, site name to the reason it is missing
+        """
+
+        results, failures = self.gather('get_group_members', group_name,
+                                        include_type)
+        return ([(site, target) for site in sorted(results)
+                 for target in results[site]], failures)
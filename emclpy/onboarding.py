@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+""" Streamed bulk onboarding of generic services.
+
+    Service specs flow through three concurrent stages: create the
+    service, apply its monitoring template, and add it to its group.
+    The create_service input XML is rendered from one parameterized
+    template into a temporary file owned by each create worker and
+    rewritten for every service.  Group assignments are batched into
+    one modify_group call per group and batch.
+"""
+
+import logging
+import os
+import string
+import tempfile
+import threading
+from xml.sax.saxutils import escape
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the stream on a stage's input queue.
+_DONE = object()
+
+# Quotes are escaped too so values are safe inside attributes.
+XML_ENTITIES = {'"': '&quot;', "'": '&apos;'}
+
+
+def _xml_value(value):
+    """ Escapes a template parameter for XML text or attribute values. """
+
+    if not isinstance(value, basestring):
+        value = str(value)
+    return escape(value, XML_ENTITIES)
+
+
+def _error_result(exception):
+    """ Stands in for [code, out, err] when a call raised instead. """
+
+    return [None, '', '{}: {}'.format(type(exception).__name__, exception)]
+
+
+class OnboardingPipeline(object):
+    """ Onboards many generic services as one streamed job.
+
+        Inputs:
+            emcli - Emclpy object
+            template - string, create_service input XML.  $name or ${name}
+                placeholders are filled from the spec's 'params' plus
+                service_name, XML escaped.
+            beacon_list - list, default OEM beacons for every service
+            template_name - string, default monitoring template, or None
+                to skip the apply_template stage
+            group_name - string, default group, or None to skip the
+                group stage
+            workers - int, concurrent calls per stage.  Defaults to 4
+            batch_size - int, services per modify_group call.
+                Defaults to 50
+            raw - bool, fill placeholders without escaping, for params
+                that hold XML fragments.  Defaults to False
+
+        Returns:
+            OnboardingPipeline object.
+
+        A spec is a dict with 'service_name' and optionally 'params',
+        'beacon_list', 'template_name', 'group_name' and 'time_zone'
+        overriding the pipeline defaults.
+    """
+
+    def __init__(self, emcli, template, beacon_list, template_name=None,
+                 group_name=None, workers=4, batch_size=50, raw=False):
+        self.emcli = emcli
+        self.template = string.Template(template)
+        self.beacon_list = beacon_list
+        self.template_name = template_name
+        self.group_name = group_name
+        self.workers = workers
+        self.batch_size = batch_size
+        self.raw = raw
+
+    def render(self, spec):
+        """ Returns the create_service input XML for spec. """
+
+        params = dict(spec.get('params', {}))
+        params['service_name'] = spec['service_name']
+        if not self.raw:
+            params = dict((name, _xml_value(value))
+                          for name, value in params.items())
+        return self.template.substitute(params)
+
+    def run(self, specs):
+        """ Onboards every spec.
+
+            Inputs:
+                specs - iterable of spec dicts.  It is consumed lazily, so
+                    a generator keeps memory use flat.
+
+            Returns:
+                generator of result dicts, in completion order:
+                    'service_name' - string
+                    'status' - string, 'done' or 'failed'
+                    'step' - string, 'create', 'template' or 'group' for
+                        a failed service, else None
+                    'result' - list, [code, out, err] of the last call.
+                        code is None when the call raised, for example
+                        on a template parameter missing from the spec.
+
+            Raises whatever the specs iterable raised, once the services
+            read before the error have finished.
+        """
+
+        created = queue.Queue(self.workers * 2)
+        templated = queue.Queue(self.workers * 2)
+        results = queue.Queue()
+        inputs = queue.Queue(self.workers * 2)
+        errors = []
+
+        stages = [threading.Thread(target=self._feed,
+                                   args=(specs, inputs, errors))]
+        stages += self._start(self._create, inputs, created, self.workers,
+                              self.workers)
+        stages += self._start(self._apply_template, created, templated,
+                              self.workers, 1)
+        stages += self._start(self._group, templated, results, 1, 1)
+        stages[0].daemon = True
+        stages[0].start()
+
+        while True:
+            result = results.get()
+            if result is _DONE:
+                break
+            yield result
+        for stage in stages:
+            stage.join()
+        if errors:
+            raise errors[0]
+
+    def _feed(self, specs, inputs, errors):
+        try:
+            for spec in specs:
+                inputs.put(spec)
+        except Exception as exception:
+            errors.append(exception)
+        finally:
+            for _ in range(self.workers):
+                inputs.put(_DONE)
+
+    def _start(self, target, inbox, outbox, count, consumers):
+        """ Starts count workers running target(inbox, outbox).  The last
+            worker to finish passes end of stream on to the consumers
+            workers reading outbox.
+        """
+
+        remaining = [count]
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                target(inbox, outbox)
+            except Exception:
+                logger.exception('onboarding stage %s failed',
+                                 target.__name__)
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    if remaining[0] == 0:
+                        for _ in range(consumers):
+                            outbox.put(_DONE)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        return threads
+
+    def _failed(self, spec, step, result):
+        return {'service_name': spec.get('service_name'),
+                'status': 'failed', 'step': step, 'result': result}
+
+    def _create(self, inbox, outbox):
+        handle, path = tempfile.mkstemp(prefix='emclpy_service_',
+                                        suffix='.xml')
+        try:
+            with os.fdopen(handle, 'w') as xml_file:
+                for spec in iter(inbox.get, _DONE):
+                    try:
+                        xml_file.seek(0)
+                        xml_file.truncate()
+                        xml_file.write(self.render(spec))
+                        xml_file.flush()
+                        result = self.emcli.create_generic_service(
+                            spec['service_name'], path,
+                            spec.get('beacon_list', self.beacon_list),
+                            spec.get('time_zone', 'America/New_York'))
+                    except Exception as exception:
+                        result = _error_result(exception)
+                    if result[0] == 0:
+                        outbox.put((spec, result))
+                    else:
+                        outbox.put((spec, self._failed(spec, 'create',
+                                                       result)))
+        finally:
+            os.remove(path)
+
+    def _apply_template(self, inbox, outbox):
+        for spec, result in iter(inbox.get, _DONE):
+            template_name = spec.get('template_name', self.template_name)
+            if isinstance(result, dict) or template_name is None:
+                outbox.put((spec, result))
+                continue
+            try:
+                result = self.emcli.apply_template(template_name,
+                                                   spec['service_name'],
+                                                   'generic_service')
+            except Exception as exception:
+                result = _error_result(exception)
+            if result[0] != 0:
+                result = self._failed(spec, 'template', result)
+            outbox.put((spec, result))
+
+    def _group(self, inbox, outbox):
+        batches = {}
+        for spec, result in iter(inbox.get, _DONE):
+            group_name = spec.get('group_name', self.group_name)
+            if isinstance(result, dict):
+                outbox.put(result)
+            elif group_name is None:
+                outbox.put({'service_name': spec['service_name'],
+                            'status': 'done', 'step': None,
+                            'result': result})
+            else:
+                batch = batches.setdefault(group_name, [])
+                batch.append(spec)
+                if len(batch) >= self.batch_size:
+                    self._flush(group_name, batches.pop(group_name), outbox)
+        for group_name, batch in batches.items():
+            self._flush(group_name, batch, outbox)
+
+    def _flush(self, group_name, batch, outbox):
+        try:
+            result = self.emcli.modify_group(
+                group_name, add_targets=[(spec['service_name'],
+                                          'generic_service')
+                                         for spec in batch])
+        except Exception as exception:
+            result = _error_result(exception)
+        for spec in batch:
+            if result[0] == 0:
+                outbox.put({'service_name': spec['service_name'],
+                            'status': 'done', 'step': None,
+                            'result': result})
+            else:
+                outbox.put(self._failed(spec, 'group', result))
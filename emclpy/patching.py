@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+""" Patch plan waves: concurrent creation and submission of many patch
+    plans, and batched status polling.
+
+    Plans are created and submitted through a BulkRunner, so a wave
+    can be resumed from its journal.  Status is polled with one emcli
+    argfile call per batch of plans, not one show_patch_plan process
+    per plan.  The poll interval drops back to its minimum whenever a
+    plan changes status and doubles while nothing changes.  A plan stays
+    pending until it reaches one of TERMINAL_STATUSES.
+"""
+
+import logging
+import os
+import tempfile
+import time
+
+from . import iter_lines
+from .bulk import BulkRunner, Job, Step
+
+logger = logging.getLogger(__name__)
+
+# Patch plan statuses that no longer change without a new submission.
+# Anything else, including scheduled and in progress states, is pending.
+TERMINAL_STATUSES = ('New', 'Analysis Successful', 'Analysis Failed',
+                     'Ready for Deployment', 'Conflicts',
+                     'Preparation Successful', 'Preparation Failed',
+                     'Deployed', 'Deployment Successful',
+                     'Deployment Failed', 'Switchback Successful',
+                     'Switchback Failed', 'Cancelled')
+
+
+def is_pending(status, terminal_statuses=TERMINAL_STATUSES):
+    """ Returns True while a patch plan status may still change.  An
+        unknown (None) status is pending.
+    """
+
+    if status is None:
+        return True
+    return status.lower() not in set(terminal.lower()
+                                     for terminal in terminal_statuses)
+
+
+def parse_patch_plan_status(output):
+    """ Reads plan statuses from the output of one or more
+        show_patch_plan -info calls.
+
+        Inputs:
+            output - string or file object, show_patch_plan output
+
+        Returns:
+            dict, plan name to status string
+    """
+
+    statuses = {}
+    name = None
+    for line in iter_lines(output):
+        key, separator, value = line.partition(':')
+        if not separator:
+            continue
+        key = key.strip().lower()
+        if key in ('name', 'plan name'):
+            name = value.strip()
+        elif key in ('status', 'plan status') and name is not None:
+            statuses[name] = value.strip()
+    return statuses
+
+
+class PatchPlanManager(object):
+    """ Creates, submits and tracks many patch plans.
+
+        Inputs:
+            emcli - Emclpy object
+            journal_path - string, BulkRunner journal for create_and_submit.
+                Defaults to None (a temporary journal, no resume)
+            workers - int, plans created or submitted at once.
+                Defaults to 8
+            min_interval - float, seconds between polls while plans are
+                changing status.  Defaults to 30
+            max_interval - float, longest wait between polls.
+                Defaults to 600
+            batch_size - int, plans per argfile poll.  Defaults to 100
+            max_failed_polls - int, consecutive polls a plan may go
+                without a status before wait() gives up on it.
+                Defaults to 5
+            terminal_statuses - tuple, statuses that end a wait.
+                Defaults to TERMINAL_STATUSES
+
+        Returns:
+            PatchPlanManager object.
+    """
+
+    def __init__(self, emcli, journal_path=None, workers=8, min_interval=30,
+                 max_interval=600, batch_size=100, max_failed_polls=5,
+                 terminal_statuses=TERMINAL_STATUSES):
+        self.emcli = emcli
+        self.max_failed_polls = max_failed_polls
+        self.terminal_statuses = terminal_statuses
+        self.failed_polls = 0
+        self.journal_path = journal_path
+        self.workers = workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+
+    def create_and_submit(self, plans, action='analyze', retries=3,
+                          backoff=5.0):
+        """ Creates and submits every plan concurrently.
+
+            Inputs:
+                plans - iterable, (plan name, input file) tuples
+                action - string, submit_patch_plan action.
+                    Defaults to 'analyze'
+                retries, backoff - passed on to BulkRunner
+
+            Returns:
+                dict, plan name to the BulkRunner result for its job
+        """
+
+        jobs = [Job(name, [Step('create', 'create_patch_plan',
+                                {'plan_name': name,
+                                 'input_file': input_file},
+                                ('already exists',)),
+                           Step(action, 'submit_patch_plan',
+                                {'plan_name': name, 'action': action})])
+                for name, input_file in plans]
+        journal_path = self.journal_path
+        if journal_path is None:
+            handle, journal_path = tempfile.mkstemp(prefix='emclpy_patch_')
+            os.close(handle)
+        try:
+            runner = BulkRunner(self.emcli, journal_path, self.workers,
+                                retries, backoff)
+            return runner.run(jobs)
+        finally:
+            if self.journal_path is None:
+                os.remove(journal_path)
+
+    def poll(self, plan_names):
+        """ Reads the status of every plan with one emcli process per
+            batch_size plans.
+
+            Inputs:
+                plan_names - iterable, patch plan names
+
+            Returns:
+                dict, plan name to status.  Plans emcli did not report
+                on map to None.  Every argfile call that exits non zero
+                is logged and counted in self.failed_polls.
+        """
+
+        plan_names = list(plan_names)
+        statuses = dict((name, None) for name in plan_names)
+        for index in range(0, len(plan_names), self.batch_size):
+            batch = plan_names[index:index + self.batch_size]
+            code, out, err = self.emcli.argfile(
+                [['show_patch_plan', '-name={}'.format(name), '-info']
+                 for name in batch])
+            if code != 0:
+                self.failed_polls += 1
+                logger.warning('patch plan poll of %d plans exited %s: %s',
+                               len(batch), code, err.strip())
+            for name, status in parse_patch_plan_status(out).items():
+                if name in statuses:
+                    statuses[name] = status
+        return statuses
+
+    def wait(self, plan_names, timeout=None):
+        """ Polls until every plan reaches a terminal status.  A plan
+            missing from a poll keeps its last known status and stays
+            pending, so a failed poll does not end the wait.
+
+            Inputs:
+                plan_names - iterable, patch plan names
+                timeout - float, seconds to give up after.
+                    Defaults to None (wait forever)
+
+            Returns:
+                dict, plan name to its last polled status, None for a
+                plan that was never reported
+        """
+
+        start = time.time()
+        interval = self.min_interval
+        pending = set(plan_names)
+        statuses = dict((name, None) for name in pending)
+        missed = dict((name, 0) for name in pending)
+        while pending:
+            current = self.poll(sorted(pending))
+            changed = False
+            for name, status in current.items():
+                if status is None:
+                    missed[name] += 1
+                    if missed[name] >= self.max_failed_polls:
+                        logger.warning('no status for patch plan %s after '
+                                       '%d polls', name, missed[name])
+                        pending.discard(name)
+                    continue
+                missed[name] = 0
+                if statuses[name] != status:
+                    changed = True
+                    statuses[name] = status
+                if not is_pending(status, self.terminal_statuses):
+                    pending.discard(name)
+            if not pending:
+                break
+            if changed:
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+            if timeout is not None and \
+                    time.time() - start + interval > timeout:
+                break
+            time.sleep(interval)
+        return statuses
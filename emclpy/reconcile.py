@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+""" Desired state reconciliation of group memberships and target
+    properties.
+
+    The caller declares the memberships and properties it expects.  The
+    Reconciler diffs them against the live groups and a cache of the
+    property values it last applied.  It then plans only the batched
+    create_group, modify_group and set_target_property_value calls
+    needed to close the gap.  emcli has no verb that reads property
+    values back, so properties are compared against that cache rather
+    than against the OMS.
+
+    Desired targets are checked against get_targets first, because one
+    unknown target fails its whole batched call.  A read that fails
+    raises ReadError instead of being planned from, since an empty
+    answer would look like missing groups or members.
+"""
+
+import json
+import logging
+import os
+
+from .bulk import Step
+
+logger = logging.getLogger(__name__)
+
+
+class ReadError(RuntimeError):
+    """ An emcli read needed for planning failed. """
+
+
+def _check(status, what):
+    """ Raises ReadError unless the status of a read is success. """
+
+    if status['code'] != 0:
+        raise ReadError('{} exited {}: {}'.format(what, status['code'],
+                                                  status['err'].strip()))
+
+
+def _chunks(items, size):
+    """ Splits items into lists of at most size elements. """
+
+    items = list(items)
+    return [items[index:index + size] for index in range(0, len(items), size)]
+
+
+class Reconciler(object):
+    """ Plans and applies the minimum calls to reach a desired state.
+
+        Inputs:
+            emcli - Emclpy object
+            property_cache - string, JSON file holding the property values
+                applied by earlier runs.  Defaults to None (no cache, every
+                desired property is applied)
+            batch_size - int, maximum targets or property records per
+                emcli call, which keeps argv within OS limits.
+                Defaults to 200
+
+        Returns:
+            Reconciler object.
+    """
+
+    def __init__(self, emcli, property_cache=None, batch_size=200):
+        self.emcli = emcli
+        self.property_cache = property_cache
+        self.batch_size = batch_size
+        self.unknown_targets = set()
+
+    def current_groups(self, group_names):
+        """ Reads the live members of group_names.
+
+            Inputs:
+                group_names - iterable, groups to read
+
+            Returns:
+                dict, group name to set of (target name, target type).
+                Groups that do not exist are left out.
+
+            Raises ReadError if emcli fails to list the groups or their
+            members.
+        """
+
+        status = {}
+        existing = set(self.emcli.get_groups(status))
+        _check(status, 'get_groups')
+        groups = {}
+        for name in group_names:
+            if name in existing:
+                groups[name] = set(self.emcli.get_group_members(
+                    name, include_type=True, status=status))
+                _check(status, 'get_group_members {}'.format(name))
+        return groups
+
+    def current_targets(self, target_types):
+        """ Reads the targets of target_types that exist on the OMS.
+
+            Inputs:
+                target_types - iterable, target types to read
+
+            Returns:
+                set of (target name, target type)
+
+            Raises ReadError if emcli fails to list the targets.
+        """
+
+        targets = set()
+        for target_type in sorted(set(target_types)):
+            code, found, err = self.emcli.get_targets(target_type)
+            _check({'code': code, 'err': err},
+                   'get_targets {}'.format(target_type))
+            targets.update((name, record['target_type'])
+                           for name, record in found.items())
+        return targets
+
+    def current_properties(self):
+        """ Returns the cached property values as a dict of
+            (target name, target type) to {property: value}.
+        """
+
+        if not self.property_cache or not os.path.exists(self.property_cache):
+            return {}
+        with open(self.property_cache) as cache:
+            return dict((tuple(key.rsplit(':', 1)), values)
+                        for key, values in json.load(cache).items())
+
+    def plan(self, groups=None, properties=None, current_groups=None,
+             prune=True, current_targets=None):
+        """ Diffs the desired state against the current state.  Desired
+            targets that do not exist are left out of the plan, logged
+            and kept in self.unknown_targets.
+
+            Inputs:
+                groups - dict, group name to iterable of (target name,
+                    target type) expected in the group.  Defaults to None
+                properties - dict, (target name, target type) to
+                    {property name: value}.  Defaults to None
+                current_groups - dict, cached result of current_groups().
+                    Defaults to None (read live)
+                prune - bool, remove members not in the desired state.
+                    Defaults to True
+                current_targets - set, cached result of
+                    current_targets().  Defaults to None (read live)
+
+            Returns:
+                list of emclpy.bulk.Step, in the order they must run
+
+            Raises ReadError if a live read fails.
+        """
+
+        groups = groups or {}
+        properties = properties or {}
+        if current_groups is None:
+            current_groups = self.current_groups(groups)
+        wanted = set(tuple(target) for members in groups.values()
+                     for target in members) | set(properties)
+        if current_targets is None:
+            current_targets = self.current_targets(
+                target_type for _, target_type in wanted)
+        self.unknown_targets = wanted - set(current_targets)
+        for target in sorted(self.unknown_targets):
+            logger.warning('skipping unknown target %s:%s', *target)
+
+        steps = []
+        for name in sorted(groups):
+            desired = set(tuple(target) for target in groups[name]) - \
+                self.unknown_targets
+            if name not in current_groups:
+                batches = _chunks(sorted(desired), self.batch_size) or [[]]
+                steps.append(Step('create_group', 'create_group',
+                                  {'group_name': name,
+                                   'members': batches[0]}))
+                add, delete = batches[1:], []
+            else:
+                current = current_groups[name]
+                add = _chunks(sorted(desired - current), self.batch_size)
+                delete = (_chunks(sorted(current - desired), self.batch_size)
+                          if prune else [])
+            for index in range(max(len(add), len(delete))):
+                steps.append(Step('modify_group', 'modify_group',
+                                  {'group_name': name,
+                                   'add_targets': (add[index]
+                                                   if index < len(add)
+                                                   else None),
+                                   'delete_targets': (delete[index]
+                                                      if index < len(delete)
+                                                      else None)}))
+
+        cached = self.current_properties()
+        records = []
+        for target in sorted(set(properties) - self.unknown_targets):
+            current = cached.get(target, {})
+            for prop, value in sorted(properties[target].items()):
+                if current.get(prop) != value:
+                    records.append((target[0], target[1], prop, value))
+        for batch in _chunks(records, self.batch_size):
+            steps.append(Step('set_target_property_value',
+                              'set_target_property_records',
+                              {'records': batch}))
+        return steps
+
+    def apply(self, steps):
+        """ Runs planned steps in order and caches the property values
+            that were applied successfully.
+
+            Inputs:
+                steps - list of emclpy.bulk.Step from plan()
+
+            Returns:
+                list, (step, [code, out, err]) for every step
+        """
+
+        results = []
+        applied = []
+        for step in steps:
+            result = getattr(self.emcli, step.method)(**step.kwargs)
+            results.append((step, result))
+            if step.method == 'set_target_property_records' and \
+                    result[0] == 0:
+                applied.extend(step.kwargs['records'])
+        if applied and self.property_cache:
+            cached = self.current_properties()
+            for name, target_type, prop, value in applied:
+                cached.setdefault((name, target_type), {})[prop] = value
+            with open(self.property_cache + '.tmp', 'w') as cache:
+                json.dump(dict(('{}:{}'.format(*key), values)
+                               for key, values in cached.items()), cache)
+            os.rename(self.property_cache + '.tmp', self.property_cache)
+        return results
+
+    def reconcile(self, groups=None, properties=None, prune=True):
+        """ Plans and applies in one call.  See plan() and apply(). """
+
+        return self.apply(self.plan(groups, properties, prune=prune))
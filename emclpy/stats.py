@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+""" Per verb latency and throughput statistics for emcli calls.
+
+    Every call made through an Emclpy object is recorded here.  The
+    aggregated numbers are available from Emclpy.stats().
+"""
+
+import threading
+
+# Upper bounds, in seconds, of the latency histogram buckets.  emcli
+# calls start a JVM, so nothing useful happens below a tenth of a second.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                   120.0, 300.0, float('inf'))
+
+# Argument prefixes whose values are replaced before argv is recorded
+# or handed to hooks.
+REDACTED_ARGS = ('-password=', '-pwd=', '-credential_set=')
+REDACTED = '********'
+
+
+def redact(command):
+    """ Returns a copy of command with credential values masked.
+
+        Inputs:
+            command - list, command and arguments
+
+        Returns:
+            list, command with credential values replaced by REDACTED
+    """
+
+    redacted = []
+    for arg in command:
+        for prefix in REDACTED_ARGS:
+            if arg.startswith(prefix):
+                arg = prefix + REDACTED
+                break
+        redacted.append(arg)
+    return redacted
+
+
+class Histogram(object):
+    """ Fixed bucket histogram of observed values.
+
+        Inputs:
+            buckets - tuple, sorted bucket upper bounds.
+                Defaults to LATENCY_BUCKETS
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        """ Adds value to the histogram. """
+
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def to_dict(self):
+        """ Returns the histogram as a dict of plain values. """
+
+        return {'count': self.count,
+                'sum': self.total,
+                'min': self.min,
+                'max': self.max,
+                'buckets': zip(self.buckets, self.counts)}
+
+
+class VerbStats(object):
+    """ Counters and histograms for a single emcli verb. """
+
+    def __init__(self):
+        self.calls = 0
+        self.killed = {}
+        self.exit_codes = {}
+        self.stdout_bytes = 0
+        self.stderr_bytes = 0
+        self.wall_time = Histogram()
+        self.first_byte = Histogram()
+
+    def record(self, call):
+        """ Adds a call record (see Stats.record) to the totals. """
+
+        self.calls += 1
+        self.exit_codes[call['code']] = self.exit_codes.get(call['code'],
+                                                            0) + 1
+        if call.get('killed'):
+            self.killed[call['killed']] = self.killed.get(call['killed'],
+                                                          0) + 1
+        self.stdout_bytes += call['stdout_bytes']
+        self.stderr_bytes += call['stderr_bytes']
+        self.wall_time.observe(call['wall_time'])
+        if call['first_byte'] is not None:
+            self.first_byte.observe(call['first_byte'])
+
+    def to_dict(self):
+        """ Returns the verb statistics as a dict of plain values. """
+
+        return {'calls': self.calls,
+                'exit_codes': dict(self.exit_codes),
+                'killed': dict(self.killed),
+                'stdout_bytes': self.stdout_bytes,
+                'stderr_bytes': self.stderr_bytes,
+                'wall_time': self.wall_time.to_dict(),
+                'first_byte': self.first_byte.to_dict()}
+
+
+class Stats(object):
+    """ Thread safe collection of VerbStats keyed by verb name. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._verbs = {}
+
+    def record(self, call):
+        """ Records one finished call.
+
+            Inputs:
+                call - dict with the following keys:
+                    'verb' - string, emcli verb
+                    'argv' - list, redacted command
+                    'code' - int, exit code
+                    'wall_time' - float, seconds from start to exit
+                    'first_byte' - float, seconds to the first byte on
+                        stdout or stderr, None if there was no output
+                    'stdout_bytes' - int, bytes written to stdout
+                    'stderr_bytes' - int, bytes written to stderr
+                    'killed' - string, 'timeout' or 'cancelled' when the
+                        call was killed, else None
+        """
+
+        with self._lock:
+            verb_stats = self._verbs.get(call['verb'])
+            if verb_stats is None:
+                verb_stats = self._verbs[call['verb']] = VerbStats()
+            verb_stats.record(call)
+
+    def snapshot(self):
+        """ Returns a dict of verb name to VerbStats.to_dict(). """
+
+        with self._lock:
+            return dict((verb, verb_stats.to_dict())
+                        for verb, verb_stats in self._verbs.items())
+
+    def reset(self):
+        """ Discards everything recorded so far. """
+
+        with self._lock:
+            self._verbs = {}
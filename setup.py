@@ -35,6 +35,11 @@ setup(
     ],
     package_dir={'emclpy':
                  'emclpy'},
+    entry_points={
+        'console_scripts': [
+            'emclpy=emclpy.cli:main'
+        ]
+    },
     include_package_data=True,
     install_requires=requirements,
     license="ISCL",
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+fake_emcli
+----------------------------------
+
+A stand-in for the emcli executable so emclpy can be tested and
+benchmarked without an OMS.  Point Emclpy.emcli_bin at this file.
+
+Behaviour is controlled with environment variables:
+
+    FAKE_EMCLI_STARTUP - float, seconds to sleep before running a verb,
+        emulating JVM startup.  Defaults to 0.
+    FAKE_EMCLI_TARGETS - int, number of synthetic targets.  Defaults to 9.
+    FAKE_EMCLI_GROUPS - int, number of synthetic groups.  Defaults to 1.
+    FAKE_EMCLI_STATE - string, path of a JSON file holding changes made
+        by modify verbs.  Without it every call sees the synthetic
+        estate and changes are discarded.
+    FAKE_EMCLI_PATCH_SECONDS - float, seconds a submitted patch plan
+        stays in progress.  Defaults to 0.
+
+Synthetic targets come in threes per host: the host, its agent (which
+monitors the host and database) and a database.  Target i belongs to
+synthetic group i % FAKE_EMCLI_GROUPS.  The host emcc.example.com is
+always present and belongs to Test_Group.
+"""
+
+import fcntl
+import json
+import os
+import shlex
+import sys
+import time
+
+
+def synthetic_targets(count):
+    """ Yields (name, type, agent) for count synthetic targets. """
+
+    yield 'emcc.example.com', 'host', 'emcc.example.com:3872'
+    for index in range(count):
+        host = 'host{0:06d}.example.com'.format(index // 3)
+        agent = host + ':3872'
+        kind = index % 3
+        if kind == 0:
+            yield host, 'host', agent
+        elif kind == 1:
+            yield agent, 'oracle_emd', agent
+        else:
+            yield ('db{0:06d}.example.com'.format(index // 3),
+                   'oracle_database', agent)
+
+
+class FakeOms(object):
+    """ Synthetic estate plus the changes recorded in the state file. """
+
+    def __init__(self):
+        self.target_count = int(os.environ.get('FAKE_EMCLI_TARGETS', 9))
+        self.group_count = int(os.environ.get('FAKE_EMCLI_GROUPS', 1))
+        self.state_file = os.environ.get('FAKE_EMCLI_STATE')
+        self.state = {'added': {}, 'deleted': [], 'properties': {},
+                      'groups_created': [], 'groups_deleted': [],
+                      'members_added': {}, 'members_removed': {},
+                      'templates': {}, 'plans': {}}
+        self.lock = None
+        if self.state_file:
+            self.lock = open(self.state_file + '.lock', 'a')
+            fcntl.flock(self.lock, fcntl.LOCK_EX)
+            if os.path.exists(self.state_file):
+                with open(self.state_file) as state_file:
+                    self.state.update(json.load(state_file))
+
+    def save(self):
+        if self.state_file:
+            with open(self.state_file, 'w') as state_file:
+                json.dump(self.state, state_file)
+
+    def targets(self):
+        """ Yields (name, type, agent) for every live target. """
+
+        deleted = set(self.state['deleted'])
+        for name, target_type, agent in synthetic_targets(self.target_count):
+            if '{0}:{1}'.format(name, target_type) not in deleted:
+                yield name, target_type, agent
+        for key, agent in sorted(self.state['added'].items()):
+            name, target_type = key.rsplit(':', 1)
+            yield name, target_type, agent
+
+    def groups(self):
+        names = ['Test_Group'] + ['group{0:04d}'.format(index)
+                                  for index in range(1, self.group_count)]
+        names += self.state['groups_created']
+        return [name for name in names
+                if name not in self.state['groups_deleted']]
+
+    def group_members(self, group):
+        groups = self.groups()
+        if group not in groups:
+            return None
+        added = self.state['members_added'].get(group, [])
+        removed = set(self.state['members_removed'].get(group, []))
+        live = set('{0}:{1}'.format(name, target_type)
+                   for name, target_type, _ in self.targets())
+        members = []
+        if group not in self.state['groups_created']:
+            group_index = groups.index(group)
+            for index, (name, target_type, _) in enumerate(
+                    synthetic_targets(self.target_count)):
+                key = '{0}:{1}'.format(name, target_type)
+                if index % self.group_count == group_index and key in live:
+                    members.append(key)
+        members += [key for key in added if key in live and
+                    key not in members]
+        return [tuple(key.rsplit(':', 1)) for key in members
+                if key not in removed]
+
+
+def parse_args(args):
+    """ Turns ['-name=x', '-noheader'] into {'name': 'x', 'noheader': True}.
+    """
+
+    options = {}
+    for arg in args:
+        key, _, value = arg.lstrip('-').partition('=')
+        options[key] = value if _ else True
+    return options
+
+
+def split_targets(value):
+    """ Splits 'a:host;b:oracle_database' into ['a:host', ...]. """
+
+    return [item for item in value.split(';') if item]
+
+
+def plan_status(plan):
+    """ Returns the status of a patch plan record. """
+
+    if plan['action'] is None:
+        return 'New'
+    done = plan['submitted'] + float(os.environ.get(
+        'FAKE_EMCLI_PATCH_SECONDS', 0))
+    if plan['action'] == 'analyze':
+        if time.time() < done:
+            return 'Analysis In Progress'
+        return 'Analysis Successful'
+    if time.time() < done:
+        return 'Deployment In Progress'
+    return 'Deployed'
+
+
+def main(argv, startup=True):
+    if startup:
+        time.sleep(float(os.environ.get('FAKE_EMCLI_STARTUP', 0)))
+    if len(argv) < 2:
+        sys.stderr.write('Usage: emcli <verb> [options]\n')
+        return 1
+    verb, options = argv[1], parse_args(argv[2:])
+    out = sys.stdout
+
+    if verb in ('setup', 'login', 'logout', 'sync'):
+        out.write('{0} completed successfully\n'.format(verb))
+        return 0
+    if verb == 'argfile':
+        code = 0
+        with open(argv[2]) as args:
+            for line in args:
+                if line.strip():
+                    code = main(['emcli'] + shlex.split(line), False) or code
+        return code
+
+    oms = FakeOms()
+    if verb == 'get_targets':
+        wanted = options.get('target')
+        for name, target_type, agent in oms.targets():
+            if wanted and wanted not in (target_type,
+                                         '{0}:{1}'.format(name, target_type)):
+                continue
+            out.write('1,Up,{0},{1},0,0\n'.format(target_type, name))
+        return 0
+    if verb == 'get_groups':
+        for name in oms.groups():
+            out.write('{0},composite\n'.format(name))
+        return 0
+    if verb == 'get_group_members':
+        members = oms.group_members(options.get('name'))
+        if members is None:
+            sys.stderr.write('Group "{0}" does not exist\n'.format(
+                options.get('name')))
+            return 1
+        for name, target_type in members:
+            out.write('{0},{1}\n'.format(name, target_type))
+        return 0
+    if verb == 'show_patch_plan':
+        plan = oms.state['plans'].get(options.get('name'))
+        if plan is None:
+            sys.stderr.write('Patch plan "{0}" does not exist\n'.format(
+                options.get('name')))
+            return 1
+        out.write('Name: {0}\nStatus: {1}\n'.format(options['name'],
+                                                    plan_status(plan)))
+        return 0
+
+    if verb == 'create_group':
+        if options['name'] in oms.state['groups_deleted']:
+            oms.state['groups_deleted'].remove(options['name'])
+        oms.state['groups_created'].append(options['name'])
+        oms.state['members_added'][options['name']] = split_targets(
+            options.get('add_targets', ''))
+    elif verb == 'delete_group':
+        if options.get('name') not in oms.groups():
+            sys.stderr.write('Group does not exist\n')
+            return 1
+        oms.state['groups_deleted'].append(options['name'])
+    elif verb == 'modify_group':
+        name = options.get('name')
+        if name not in oms.groups():
+            sys.stderr.write('Group "{0}" does not exist\n'.format(name))
+            return 1
+        for key in split_targets(options.get('add_targets', '')):
+            oms.state['members_added'].setdefault(name, []).append(key)
+            if key in oms.state['members_removed'].get(name, []):
+                oms.state['members_removed'][name].remove(key)
+        for key in split_targets(options.get('delete_targets', '')):
+            oms.state['members_removed'].setdefault(name, []).append(key)
+    elif verb == 'create_service':
+        key = '{0}:{1}'.format(options['name'], options['type'])
+        if key in oms.state['added']:
+            sys.stderr.write('Target "{0}" already exists\n'.format(key))
+            return 1
+        oms.state['added'][key] = None
+    elif verb == 'apply_template':
+        for key in split_targets(options.get('targets', '')):
+            oms.state['templates'][key] = options.get('name')
+    elif verb == 'set_target_property_value':
+        for record in split_targets(options.get('property_records', '')):
+            name, target_type, prop, value = record.split(':', 3)
+            key = '{0}:{1}'.format(name, target_type)
+            oms.state['properties'].setdefault(key, {})[prop] = value
+    elif verb == 'create_patch_plan':
+        if options['name'] in oms.state['plans']:
+            sys.stderr.write('Patch plan already exists\n')
+            return 1
+        oms.state['plans'][options['name']] = {'action': None,
+                                               'submitted': None}
+    elif verb == 'submit_patch_plan':
+        plan = oms.state['plans'].get(options.get('name'))
+        if plan is None:
+            sys.stderr.write('Patch plan does not exist\n')
+            return 1
+        plan['action'] = options.get('action')
+        plan['submitted'] = time.time()
+    elif verb == 'delete_target':
+        key = '{0}:{1}'.format(options.get('name'), options.get('type'))
+        live = dict(('{0}:{1}'.format(name, target_type), agent)
+                    for name, target_type, agent in oms.targets())
+        if key not in live:
+            sys.stderr.write('Target "{0}" does not exist\n'.format(key))
+            return 1
+        doomed = [key]
+        if options.get('type') == 'oracle_emd':
+            monitored = [other for other, agent in live.items()
+                         if agent == options.get('name') and other != key]
+            if monitored and not options.get('delete_monitored_targets'):
+                sys.stderr.write('Agent still monitors targets\n')
+                return 1
+            doomed += monitored
+        for doomed_key in doomed:
+            if doomed_key in oms.state['added']:
+                del oms.state['added'][doomed_key]
+            else:
+                oms.state['deleted'].append(doomed_key)
+    else:
+        sys.stderr.write('Error: "{0}" is not a valid verb.\n'.format(verb))
+        return 1
+    oms.save()
+    out.write('{0} completed successfully\n'.format(verb))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+support
+----------------------------------
+
+Shared fixture for the tests that run against tests/fake_emcli.py.
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+import emclpy
+
+FAKE_EMCLI = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'fake_emcli.py')
+
+
+class FakeEmcliTestCase(unittest.TestCase):
+    """ Gives each test its own state directory and fake emcli state
+        file, with fake_environ added to os.environ.  The directory is
+        removed and os.environ restored once the test finishes, after
+        any tearDown of the subclass.
+    """
+
+    # Extra FAKE_EMCLI_* settings for every test of the class.
+    fake_environ = {}
+
+    def setUp(self):
+        environ = dict(os.environ)
+        self.addCleanup(self.restore_environ, environ)
+        self.state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.state_dir)
+        os.environ['FAKE_EMCLI_STATE'] = os.path.join(self.state_dir,
+                                                      'state.json')
+        os.environ.update(self.fake_environ)
+
+    @staticmethod
+    def restore_environ(environ):
+        os.environ.clear()
+        os.environ.update(environ)
+
+    def make_emcli(self, **kwargs):
+        """ Returns an Emclpy object wired to the fake emcli. """
+
+        emcli = emclpy.Emclpy('https://localhost:7799/em', 'sysman',
+                              'welcome1', **kwargs)
+        emcli.emcli_bin = FAKE_EMCLI
+        return emcli
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_bulk
+----------------------------------
+
+Tests for `emclpy.bulk` module, run against tests/fake_emcli.py.
+"""
+
+import unittest
+import os
+from emclpy import bulk
+from tests.support import FakeEmcliTestCase
+
+
+class TestBulkRunner(FakeEmcliTestCase):
+
+    fake_environ = {'FAKE_EMCLI_TARGETS': '3'}
+
+    def setUp(self):
+        super(TestBulkRunner, self).setUp()
+        self.journal = os.path.join(self.state_dir, 'journal.log')
+        self.emcli = self.make_emcli()
+
+    def jobs(self, group_name):
+        return [bulk.onboarding_job('svc{}'.format(index), '/tmp/svc.xml',
+                                    ['EM Management Beacon'], 'Template',
+                                    group_name)
+                for index in range(4)]
+
+    def test_run_and_resume(self):
+        runner = bulk.BulkRunner(self.emcli, self.journal, workers=2)
+        results = runner.run(self.jobs('Test_Group'))
+        self.assertEqual(set(result['status'] for result in results.values()),
+                         set(['done']))
+        self.assertEqual(self.emcli.stats()['create_service']['calls'], 4)
+
+        self.emcli.reset_stats()
+        results = runner.run(self.jobs('Test_Group'))
+        self.assertEqual(set(result['status'] for result in results.values()),
+                         set(['skipped']))
+        self.assertEqual(self.emcli.stats(), {})
+
+    def test_retry_then_resume(self):
+        runner = bulk.BulkRunner(self.emcli, self.journal, workers=2,
+                                 retries=2, backoff=0.01)
+        results = runner.run(self.jobs('Missing_Group'))
+        self.assertEqual(results['svc0']['status'], 'failed')
+        self.assertEqual(results['svc0']['step'], 'group')
+        self.assertEqual(self.emcli.stats()['modify_group']['calls'], 8)
+
+        self.emcli.create_group('Missing_Group')
+        self.emcli.reset_stats()
+        results = runner.run(self.jobs('Missing_Group'))
+        self.assertEqual(results['svc0']['status'], 'done')
+        self.assertEqual(sorted(self.emcli.stats()), ['modify_group'])
+
+    def test_resume_after_crash(self):
+        # A run that died after create_service ran but before it was
+        # journaled as done.
+        self.emcli.create_generic_service('svc0', '/tmp/svc.xml',
+                                          ['EM Management Beacon'])
+        bulk.Journal(self.journal).record('svc0', 'create', 'started', None)
+        runner = bulk.BulkRunner(self.emcli, self.journal, workers=2,
+                                 retries=1)
+        results = runner.run(self.jobs('Test_Group'))
+        self.assertEqual(results['svc0']['status'], 'done')
+        self.assertEqual(self.emcli.stats()['create_service']['exit_codes'],
+                         {0: 4, 1: 1})
+
+        # Without a started entry the error is a real failure.
+        job = bulk.onboarding_job('svc1', '/tmp/svc.xml',
+                                  ['EM Management Beacon'], 'Template',
+                                  'Test_Group')
+        job.key = 'svc1_again'
+        results = runner.run([job])
+        self.assertEqual(results['svc1_again']['status'], 'failed')
+
+    def test_journal_failure(self):
+        runner = bulk.BulkRunner(self.emcli, os.path.join(
+            self.state_dir, 'missing', 'journal.log'), workers=2)
+        results = runner.run(self.jobs('Test_Group'))
+        self.assertEqual(set(result['status'] for result in results.values()),
+                         set(['failed']))
+
+
+class TestDeleteTargets(FakeEmcliTestCase):
+
+    fake_environ = {'FAKE_EMCLI_TARGETS': '9'}
+
+    def setUp(self):
+        super(TestDeleteTargets, self).setUp()
+        self.emcli = self.make_emcli(cache_ttl=600)
+
+    def test_delete_targets(self):
+        code, targets, err = self.emcli.get_targets()
+        self.assertEqual(len(targets), 10)
+        self.assertTrue('db000001.example.com' in
+                        self.emcli.get_group_members('Test_Group'))
+        # Agents listed first must still be deleted after what they monitor
+        doomed = [('host000001.example.com:3872', 'oracle_emd'),
+                  ('host000000.example.com:3872', 'oracle_emd', True),
+                  ('host000001.example.com', 'host'),
+                  ('db000001.example.com', 'oracle_database')]
+        results = bulk.delete_targets(self.emcli, doomed, workers=4)
+        self.assertEqual(set(result[0] for result in results.values()),
+                         set([0]))
+        code, targets, err = self.emcli.get_targets()
+        self.assertEqual(sorted(targets), ['db000002.example.com',
+                                           'emcc.example.com',
+                                           'host000002.example.com',
+                                           'host000002.example.com:3872'])
+        self.assertFalse('db000001.example.com' in
+                         self.emcli.get_group_members('Test_Group'))
+
+    def test_agent_with_monitored_targets(self):
+        results = bulk.delete_targets(
+            self.emcli, [('host000000.example.com:3872', 'oracle_emd')])
+        self.assertEqual(results[('host000000.example.com:3872',
+                                  'oracle_emd')][0], 1)
+
+    def test_failed_dependency(self):
+        missing = ('nodb.example.com', 'oracle_database')
+        host = ('host000000.example.com', 'host')
+        agent = ('host000000.example.com:3872', 'oracle_emd')
+        other = ('host000001.example.com', 'host')
+        results = bulk.delete_targets(
+            self.emcli, [missing, host, agent + (True,), other],
+            depends_on={host: [missing]})
+        self.assertEqual(results[missing][0], 1)
+        self.assertEqual(results[host][0], None)
+        self.assertTrue(results[host][2].startswith('skipped'))
+        self.assertEqual(results[agent][0], None)
+        self.assertEqual(results[other][0], 0)
+        code, targets, err = self.emcli.get_targets()
+        self.assertTrue('host000000.example.com' in targets)
+        self.assertTrue('db000000.example.com' in targets)
+
+    def test_delete_order(self):
+        cluster = ('cluster1', 'cluster')
+        rac = ('rac1', 'rac_database')
+        instance = ('rac1_1', 'oracle_database')
+        host = ('node1', 'host')
+        agent = ('node1:3872', 'oracle_emd')
+        listener = ('lsnr1', 'oracle_listener')
+        waves = bulk.delete_order(
+            [agent, host, instance, rac, cluster, listener],
+            phases={'oracle_listener': 0},
+            depends_on={instance: [rac], host: [cluster],
+                        listener: [instance]})
+        self.assertEqual([sorted(wave) for wave in waves],
+                         [[cluster, rac], [instance], [listener, host],
+                          [agent]])
+        self.assertRaises(ValueError, bulk.delete_order, [rac, instance],
+                          depends_on={rac: [instance], instance: [rac]})
+
+    def test_cached_targets_are_copies(self):
+        code, targets, err = self.emcli.get_targets()
+        targets['emcc.example.com']['site'] = 'emea'
+        del targets['db000000.example.com']
+        code, targets, err = self.emcli.get_targets()
+        self.assertFalse('site' in targets['emcc.example.com'])
+        self.assertTrue('db000000.example.com' in targets)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
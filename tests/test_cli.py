@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cli
+----------------------------------
+
+Tests for `emclpy.cli` module, run against tests/fake_emcli.py.
+"""
+
+import unittest
+import json
+import os
+from emclpy import cli
+from tests.support import FAKE_EMCLI, FakeEmcliTestCase
+
+
+class TestCli(FakeEmcliTestCase):
+
+    fake_environ = {'FAKE_EMCLI_TARGETS': '3'}
+
+    def setUp(self):
+        super(TestCli, self).setUp()
+        self.input = os.path.join(self.state_dir, 'ops.jsonl')
+        self.output = os.path.join(self.state_dir, 'results.jsonl')
+
+    def run_cli(self, operations, emcli_bin=FAKE_EMCLI):
+        with open(self.input, 'w') as ops:
+            ops.write(operations)
+        code = cli.main([self.input, '-o', self.output,
+                         '--url', 'https://localhost:7799/em',
+                         '--username', 'sysman', '--password', 'welcome1',
+                         '--state-dir', self.state_dir,
+                         '--emcli-bin', emcli_bin, '-j', '3', '--login'])
+        with open(self.output) as results:
+            return code, dict((result['id'], result)
+                              for result in map(json.loads, results))
+
+    def test_operations(self):
+        operations = [{'id': index, 'verb': 'add_to_group',
+                       'args': {'group_name': 'Test_Group',
+                                'target_name': 'svc{}'.format(index),
+                                'target_type': 'generic_service'}}
+                      for index in range(5)]
+        operations.append({'id': 'groups', 'verb': 'get_groups'})
+        code, results = self.run_cli(
+            '\n'.join(json.dumps(operation) for operation in operations))
+        self.assertEqual(code, 0)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results[4]['code'], 0)
+        self.assertEqual(results['groups']['result'], ['Test_Group'])
+
+    def test_errors(self):
+        code, results = self.run_cli('{"id": 1, "verb": "stats"}\n'
+                                     'not json\n'
+                                     '{"id": 2, "verb": "delete_group",'
+                                     ' "args": {"group_name": "Nope"}}\n')
+        self.assertEqual(code, 1)
+        self.assertTrue('unknown verb' in results[1]['error'])
+        self.assertTrue(results[None]['error'].startswith('line 2'))
+        self.assertEqual(results[2]['code'], 1)
+
+    def test_non_utf8_output(self):
+        emcli_bin = os.path.join(self.state_dir, 'emcli')
+        with open(emcli_bin, 'w') as script:
+            script.write("#!/bin/sh\nprintf 'caf\\351\\n'\n")
+        os.chmod(emcli_bin, 0o755)
+        code, results = self.run_cli('{"id": 1, "verb": "sync"}\n'
+                                     '{"id": 2, "verb": "logout"}\n',
+                                     emcli_bin)
+        self.assertEqual(code, 0)
+        self.assertEqual(results[1]['out'], u'caf\ufffd\n')
+        self.assertEqual(results[2]['code'], 0)
+
+    def test_dumps(self):
+        self.assertTrue('unserializable' in json.loads(
+            cli.dumps({'id': 1, 'verb': 'sync', 'result': object()}))['error'])
+
+    def test_missing_password(self):
+        os.environ.pop('EMCLPY_PASSWORD', None)
+        self.assertRaises(SystemExit, cli.parse_args,
+                          ['--url', 'https://localhost:7799/em',
+                           '--username', 'sysman'])
+        os.environ['EMCLPY_PASSWORD'] = 'welcome1'
+        self.assertEqual(cli.parse_args(
+            ['--url', 'https://localhost:7799/em',
+             '--username', 'sysman']).password, 'welcome1')
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
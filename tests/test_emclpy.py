@@ -12,6 +12,7 @@ import unittest
 import os
 import time
 import emclpy
+from tests.support import FAKE_EMCLI, FakeEmcliTestCase
 
 # Environments for testing.
 # Set url appropriately before running tests.
@@ -47,6 +48,58 @@ class TestEmclpy(unittest.TestCase):
         command = ['echo', 'bob']
         self.assertEqual(emclpy.command_runner(command)[0], 0)
 
+    def test_command_runner_spill(self):
+        command = ['seq', '1', '100000']
+        code, out, err = emclpy.command_runner(command, spill_threshold=1024)
+        self.assertEqual(code, 0)
+        lines = list(emclpy.iter_lines(out))
+        self.assertEqual(len(lines), 100000)
+        self.assertEqual(lines[-1], '100000')
+        self.assertEqual(err.read(), '')
+        emclpy.close_output([code, out, err])
+        self.assertTrue(out.closed)
+
+    def test_command_runner_timeout(self):
+        # The background sleep holds the pipes open, so only killing the
+        # whole process group lets the call return.
+        command = ['sh', '-c', 'sleep 30 & wait']
+        timings = {}
+        start = time.time()
+        code, out, err = emclpy.command_runner(command, timings=timings,
+                                               timeout=0.3)
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(code, -9)
+        self.assertEqual(timings['killed'], 'timeout')
+
+    def test_command_runner_closed_pipes(self):
+        # The pipes close at once, so only the deadline on the process
+        # itself ends the call.
+        command = ['sh', '-c', 'exec >&- 2>&-; sleep 5']
+        timings = {}
+        start = time.time()
+        code, out, err = emclpy.command_runner(command, timings=timings,
+                                               timeout=0.5)
+        self.assertTrue(time.time() - start < 3)
+        self.assertEqual(code, -9)
+        self.assertEqual(timings['killed'], 'timeout')
+
+    def test_Emclpy_stats(self):
+        calls = []
+        emcli = emclpy.Emclpy(url, username, password)
+        emcli.emcli_bin = 'echo'
+        emcli.add_post_hook(calls.append)
+        emcli.login()
+        emcli.sync()
+        emcli.sync()
+        stats = emcli.stats()
+        self.assertEqual(stats['sync']['calls'], 2)
+        self.assertEqual(stats['sync']['exit_codes'], {0: 2})
+        self.assertEqual(stats['sync']['stdout_bytes'], 10)
+        self.assertEqual(stats['sync']['wall_time']['count'], 2)
+        self.assertEqual(stats['setup']['calls'], 1)
+        self.assertTrue('-password=********' in calls[0]['argv'])
+        self.assertFalse('-password={}'.format(password) in calls[0]['argv'])
+
     def test_Emclpy_sync(self):
         emcli = emclpy.Emclpy(url, username, password)
         emcli.login()
@@ -133,6 +186,103 @@ class TestEmclpy(unittest.TestCase):
         emcli.logout()
 
 
+class TestEmclpyFake(FakeEmcliTestCase):
+    """ Tests run against tests/fake_emcli.py instead of a live OMS. """
+
+    fake_environ = {'FAKE_EMCLI_TARGETS': '30'}
+
+    def setUp(self):
+        super(TestEmclpyFake, self).setUp()
+        self.emcli = self.make_emcli()
+
+    def test_get_targets(self):
+        code, targets, err = self.emcli.get_targets()
+        self.assertEqual(code, 0)
+        self.assertEqual(len(targets), 31)
+        self.assertEqual(targets['emcc.example.com']['target_type'], 'host')
+        code, targets, err = self.emcli.get_targets('oracle_emd')
+        self.assertEqual(len(targets), 10)
+
+    def test_iter_targets(self):
+        results = []
+        run = self.emcli._run
+
+        def record(*args):
+            results.append(run(*args))
+            return results[-1]
+
+        self.emcli._run = record
+        self.emcli.spill_threshold = 256
+        status = {}
+        targets = self.emcli.iter_targets(status=status)
+        name, record = next(targets)
+        self.assertEqual(status, {'code': 0, 'err': ''})
+        self.assertEqual(record['target_type'], 'host')
+        self.assertEqual(len(list(targets)), 30)
+        self.assertTrue(results[0][1].closed)
+        self.assertTrue(results[0][2].closed)
+        self.assertEqual(list(self.emcli.iter_group_members('Test_Group')),
+                         list(self.emcli.get_group_members('Test_Group',
+                                                           True)))
+        self.assertTrue(all(output.closed for result in results
+                            for output in result[1:]))
+
+    def test_killed_read(self):
+        # One full record, one cut short, then killed by the timeout.
+        truncated_emcli = os.path.join(self.state_dir, 'truncated_emcli')
+        with open(truncated_emcli, 'w') as script:
+            script.write('#!/bin/sh\n'
+                         'printf "1,Up,host,h1.example.com,0,0\\n1,Up,ho"\n'
+                         'sleep 5\n')
+        os.chmod(truncated_emcli, 0o700)
+        emcli = emclpy.Emclpy(url, username, password, timeout=0.5)
+        emcli.emcli_bin = truncated_emcli
+        code, targets, err = emcli.get_targets()
+        self.assertEqual((code, targets), (-9, {}))
+        status = {}
+        self.assertEqual(emcli.get_group_members('Test_Group',
+                                                 status=status), [])
+        self.assertEqual(status['code'], -9)
+        self.assertEqual(emcli.get_groups(status), [])
+        self.assertEqual(status['code'], -9)
+
+    def test_group_round_trip(self):
+        self.assertEqual(self.emcli.create_group('Test_Group2')[0], 0)
+        self.assertEqual(self.emcli.add_to_group('Test_Group2',
+                                                 'emcc.example.com',
+                                                 'host')[0], 0)
+        self.assertEqual(self.emcli.get_group_members('Test_Group2'),
+                         ['emcc.example.com'])
+        self.assertEqual(self.emcli.delete_group('Test_Group2')[0], 0)
+        self.assertFalse('Test_Group2' in self.emcli.get_groups())
+
+    def test_hedged_read(self):
+        slow_emcli = os.path.join(self.state_dir, 'slow_emcli')
+        with open(slow_emcli, 'w') as script:
+            script.write('#!/bin/sh\n'
+                         'case "$EMCLI_STATE_DIR" in\n'
+                         '    */hedge) ;;\n'
+                         '    *) sleep 30 ;;\n'
+                         'esac\n'
+                         'exec {} "$@"\n'.format(FAKE_EMCLI))
+        os.chmod(slow_emcli, 0o700)
+        emcli = emclpy.Emclpy(url, username, password,
+                              state_dir=self.state_dir, hedge_delay=0.2,
+                              hedge_url='https://vip2:7799/em')
+        emcli.emcli_bin = slow_emcli
+        start = time.time()
+        self.assertEqual(emcli.get_groups(), ['Test_Group'])
+        self.assertTrue(time.time() - start < 5)
+        time.sleep(0.5)
+        stats = emcli.stats()['get_groups']
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['killed'], {'cancelled': 1})
+
+    def test_hedged_read_raises(self):
+        emcli = emclpy.Emclpy(url, username, password,
+                              state_dir=self.state_dir, hedge_delay=0.2)
+        emcli.emcli_bin = os.path.join(self.state_dir, 'missing_emcli')
+        self.assertRaises(OSError, emcli.get_groups)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_federation
+----------------------------------
+
+Tests for `emclpy.federation` module, run against tests/fake_emcli.py.
+"""
+
+import unittest
+import os
+import stat
+import threading
+import time
+from emclpy import federation
+from tests.support import FAKE_EMCLI, FakeEmcliTestCase
+
+
+class TestFederatedEmclpy(FakeEmcliTestCase):
+
+    fake_environ = {'FAKE_EMCLI_TARGETS': '3'}
+
+    def setUp(self):
+        super(TestFederatedEmclpy, self).setUp()
+        # Each site keeps its fake state in its own emcli state directory
+        del os.environ['FAKE_EMCLI_STATE']
+        sites = {'emea': ('https://emea:7799/em', 'sysman', 'welcome1'),
+                 'apac': ('https://apac:7799/em', 'sysman', 'welcome1',
+                          0.5)}
+        self.federation = federation.FederatedEmclpy(
+            sites, timeout=30, state_root=self.state_dir,
+            emcli_bin=FAKE_EMCLI)
+
+    def tearDown(self):
+        # Let site threads finish killing their emcli before cleaning up
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread():
+                thread.join(5)
+
+    def test_isolated_sessions(self):
+        emea = self.federation.clients['emea']
+        apac = self.federation.clients['apac']
+        self.assertNotEqual(emea.state_dir, apac.state_dir)
+        results, failures = self.federation.login()
+        self.assertEqual(failures, {})
+        self.assertTrue(os.path.isdir(emea.state_dir))
+
+    def test_get_targets(self):
+        targets, failures = self.federation.get_targets()
+        self.assertEqual(failures, {})
+        self.assertEqual(len(targets), 8)
+        self.assertEqual(targets[('apac', 'emcc.example.com')]['site'],
+                         'apac')
+        groups, failures = self.federation.get_groups()
+        self.assertEqual(groups, [('apac', 'Test_Group'),
+                                  ('emea', 'Test_Group')])
+
+    def test_slow_site(self):
+        slow_emcli = os.path.join(self.state_dir, 'slow_emcli')
+        with open(slow_emcli, 'w') as script:
+            script.write('#!/bin/sh\nsleep 3\n')
+        os.chmod(slow_emcli, stat.S_IRWXU)
+        self.federation.clients['apac'].emcli_bin = slow_emcli
+        start = time.time()
+        targets, failures = self.federation.get_targets()
+        self.assertTrue(time.time() - start < 2)
+        self.assertEqual(list(failures), ['apac'])
+        self.assertEqual(set(site for site, name in targets), set(['emea']))
+
+    def test_late_failure(self):
+        def late():
+            time.sleep(1)
+            raise RuntimeError('late')
+
+        self.federation.clients['emea'].ping = lambda: 'pong'
+        self.federation.clients['apac'].ping = late
+        results, failures = self.federation.gather('ping')
+        time.sleep(1.5)
+        self.assertEqual(results, {'emea': 'pong'})
+        self.assertEqual(failures, {'apac': 'timeout'})
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_onboarding
+----------------------------------
+
+Tests for `emclpy.onboarding` module, run against tests/fake_emcli.py.
+"""
+
+import unittest
+import os
+from emclpy import onboarding
+from tests.support import FakeEmcliTestCase
+
+template = '<service name="${service_name}"><url>$url</url></service>'
+
+
+class TestOnboardingPipeline(FakeEmcliTestCase):
+
+    fake_environ = {'FAKE_EMCLI_TARGETS': '3'}
+
+    def setUp(self):
+        super(TestOnboardingPipeline, self).setUp()
+        self.emcli = self.make_emcli()
+        self.pipeline = onboarding.OnboardingPipeline(
+            self.emcli, template, ['EM Management Beacon'], 'Template',
+            'Test_Group', workers=3, batch_size=4)
+
+    def specs(self, count):
+        for index in range(count):
+            yield {'service_name': 'svc{}'.format(index),
+                   'params': {'url': 'http://app{}/'.format(index)}}
+
+    def test_render(self):
+        self.assertEqual(self.pipeline.render(
+            {'service_name': 'svc', 'params': {'url': 'http://app/'}}),
+            '<service name="svc"><url>http://app/</url></service>')
+
+    def test_render_escapes(self):
+        self.assertEqual(self.pipeline.render(
+            {'service_name': 'a"b', 'params': {'url': 'http://app/?a=1&b=2'}}),
+            '<service name="a&quot;b">'
+            '<url>http://app/?a=1&amp;b=2</url></service>')
+        self.pipeline.raw = True
+        self.assertEqual(self.pipeline.render(
+            {'service_name': 'svc', 'params': {'url': '<![CDATA[x]]>'}}),
+            '<service name="svc"><url><![CDATA[x]]></url></service>')
+
+    def test_run(self):
+        results = list(self.pipeline.run(self.specs(10)))
+        self.assertEqual(sorted(result['service_name'] for result in results),
+                         sorted('svc{}'.format(index) for index in range(10)))
+        self.assertEqual(set(result['status'] for result in results),
+                         set(['done']))
+        stats = self.emcli.stats()
+        self.assertEqual(stats['create_service']['calls'], 10)
+        self.assertEqual(stats['apply_template']['calls'], 10)
+        self.assertEqual(stats['modify_group']['calls'], 3)
+        members = self.emcli.get_group_members('Test_Group')
+        self.assertTrue('svc9' in members)
+
+    def test_failed_group(self):
+        self.pipeline.group_name = 'Missing_Group'
+        results = list(self.pipeline.run(self.specs(2)))
+        self.assertEqual([result['step'] for result in results],
+                         ['group', 'group'])
+
+    def test_missing_parameter(self):
+        specs = list(self.specs(2))
+        del specs[1]['params']
+        results = dict((result['service_name'], result)
+                       for result in self.pipeline.run(specs))
+        self.assertEqual(results['svc0']['status'], 'done')
+        self.assertEqual(results['svc1']['step'], 'create')
+        self.assertTrue('KeyError' in results['svc1']['result'][2])
+
+    def test_missing_emcli(self):
+        self.emcli.emcli_bin = os.path.join(self.state_dir, 'no_emcli')
+        results = list(self.pipeline.run(self.specs(3)))
+        self.assertEqual([result['step'] for result in results],
+                         ['create'] * 3)
+
+    def test_specs_raise(self):
+        def specs():
+            yield {'service_name': 'svc0', 'params': {'url': 'http://app/'}}
+            raise ValueError('bad spec source')
+        results = []
+        with self.assertRaises(ValueError):
+            for result in self.pipeline.run(specs()):
+                results.append(result)
+        self.assertEqual([result['service_name'] for result in results],
+                         ['svc0'])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
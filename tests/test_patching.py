@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_patching
+----------------------------------
+
+Tests for `emclpy.patching` module, run against tests/fake_emcli.py.
+"""
+
+import unittest
+import os
+from emclpy import patching
+from tests.support import FAKE_EMCLI, FakeEmcliTestCase
+
+
+class TestPatchPlanManager(FakeEmcliTestCase):
+
+    fake_environ = {'FAKE_EMCLI_PATCH_SECONDS': '0.5'}
+
+    def setUp(self):
+        super(TestPatchPlanManager, self).setUp()
+        self.emcli = self.make_emcli()
+        self.manager = patching.PatchPlanManager(self.emcli, workers=4,
+                                                 min_interval=0.1,
+                                                 max_interval=0.4,
+                                                 batch_size=4)
+
+    def test_parse_patch_plan_status(self):
+        output = 'Name: Plan A\nStatus: Deployed\nName : Plan B\n' \
+                 'Status : Analysis In Progress\n'
+        self.assertEqual(patching.parse_patch_plan_status(output),
+                         {'Plan A': 'Deployed',
+                          'Plan B': 'Analysis In Progress'})
+
+    def test_wave(self):
+        names = ['Plan {}'.format(index) for index in range(6)]
+        results = self.manager.create_and_submit(
+            [(name, '/tmp/plan.props') for name in names])
+        self.assertEqual(set(result['status'] for result in results.values()),
+                         set(['done']))
+        statuses = self.manager.wait(names, timeout=30)
+        self.assertEqual(set(statuses.values()),
+                         set(['Analysis Successful']))
+        stats = self.emcli.stats()
+        self.assertFalse('show_patch_plan' in stats)
+        self.assertTrue(stats['argfile']['calls'] >= 2)
+
+    def test_is_pending(self):
+        self.assertTrue(patching.is_pending(None))
+        self.assertTrue(patching.is_pending('Analysis Scheduled'))
+        self.assertTrue(patching.is_pending('Deployment In Progress'))
+        self.assertFalse(patching.is_pending('deployed'))
+
+    def test_missing_plan(self):
+        self.assertEqual(self.manager.poll(['Missing']), {'Missing': None})
+        self.assertEqual(self.manager.failed_polls, 1)
+        self.manager.max_failed_polls = 2
+        self.assertEqual(self.manager.wait(['Missing'], timeout=30),
+                         {'Missing': None})
+
+    def test_transient_poll_failure(self):
+        self.manager.create_and_submit([('Plan A', '/tmp/plan.props')])
+        counter = os.path.join(self.state_dir, 'counter')
+        flaky_emcli = os.path.join(self.state_dir, 'flaky_emcli')
+        with open(flaky_emcli, 'w') as script:
+            script.write('#!/bin/sh\n'
+                         'echo x >> {0}\n'
+                         'if [ $(wc -l < {0}) -le 2 ]; then exit 1; fi\n'
+                         'exec {1} "$@"\n'.format(counter, FAKE_EMCLI))
+        os.chmod(flaky_emcli, 0o700)
+        self.emcli.emcli_bin = flaky_emcli
+        self.assertEqual(self.manager.wait(['Plan A'], timeout=30),
+                         {'Plan A': 'Analysis Successful'})
+        self.assertEqual(self.manager.failed_polls, 2)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
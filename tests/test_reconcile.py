@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_reconcile
+----------------------------------
+
+Tests for `emclpy.reconcile` module, run against tests/fake_emcli.py.
+"""
+
+import unittest
+import os
+from emclpy import reconcile
+from tests.support import FakeEmcliTestCase
+
+
+class TestReconciler(FakeEmcliTestCase):
+
+    fake_environ = {'FAKE_EMCLI_TARGETS': '6'}
+
+    def setUp(self):
+        super(TestReconciler, self).setUp()
+        self.emcli = self.make_emcli()
+        self.reconciler = reconcile.Reconciler(
+            self.emcli, os.path.join(self.state_dir, 'properties.json'),
+            batch_size=2)
+
+    def test_groups(self):
+        groups = {'Test_Group': [('emcc.example.com', 'host'),
+                                 ('db000000.example.com', 'oracle_database')],
+                  'New_Group': [('host000000.example.com', 'host'),
+                                ('host000001.example.com', 'host'),
+                                ('emcc.example.com', 'host')]}
+        steps = self.reconciler.plan(groups)
+        self.assertEqual([step.method for step in steps],
+                         ['create_group', 'modify_group', 'modify_group',
+                          'modify_group', 'modify_group'])
+        for step, result in self.reconciler.apply(steps):
+            self.assertEqual(result[0], 0)
+        for name, members in groups.items():
+            self.assertEqual(sorted(self.emcli.get_group_members(
+                name, include_type=True)), sorted(members))
+        self.assertEqual(self.reconciler.plan(groups), [])
+
+    def test_properties(self):
+        properties = {('emcc.example.com', 'host'): {'Location': 'My Desk'},
+                      ('host000000.example.com', 'host'): {
+                          'Location': 'DC1', 'Contact': 'Tom Lester'}}
+        steps = self.reconciler.plan(properties=properties)
+        self.assertEqual(len(steps), 2)
+        self.reconciler.apply(steps)
+        self.assertEqual(self.reconciler.plan(properties=properties), [])
+
+        properties[('emcc.example.com', 'host')]['Location'] = 'Lab'
+        steps = self.reconciler.plan(properties=properties)
+        self.assertEqual(steps[0].kwargs['records'],
+                         [('emcc.example.com', 'host', 'Location', 'Lab')])
+
+    def test_unknown_targets(self):
+        groups = {'Test_Group': [('emcc.example.com', 'host'),
+                                 ('db000000.example.com', 'oracle_database'),
+                                 ('nohost.example.com', 'host')]}
+        properties = {('nohost.example.com', 'host'): {'Location': 'DC1'}}
+        steps = self.reconciler.plan(groups, properties, prune=False)
+        self.assertEqual(self.reconciler.unknown_targets,
+                         set([('nohost.example.com', 'host')]))
+        self.assertEqual(steps, [])
+
+    def test_failed_read(self):
+        failing_emcli = os.path.join(self.state_dir, 'failing_emcli')
+        with open(failing_emcli, 'w') as script:
+            script.write('#!/bin/sh\necho "Error: session expired" >&2\n'
+                         'exit 1\n')
+        os.chmod(failing_emcli, 0o700)
+        self.emcli.emcli_bin = failing_emcli
+        self.assertRaises(reconcile.ReadError, self.reconciler.plan,
+                          {'Test_Group': [('emcc.example.com', 'host')]})
+        self.assertRaises(reconcile.ReadError, self.reconciler.plan,
+                          {'Test_Group': [('emcc.example.com', 'host')]},
+                          current_groups={'Test_Group': set()})
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())